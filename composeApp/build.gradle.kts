@@ -90,6 +90,7 @@ tasks.register("bundleBabelfish") {
                 into(stagingDir)
                 exclude(
                     ".venv/**",
+                    ".venvs/**",
                     "models/**",
                     "tmp_extraction/**",
                     ".git/**",
@@ -125,13 +126,21 @@ tasks.register("bundleBabelfish") {
             println("Warning: pyproject.toml not found in ${contentDir.absolutePath}")
         }
 
-        // Inject bootstrap.py
-        val bootstrapFile = file("src/jvmMain/resources/scripts/bootstrap.py")
-        if (bootstrapFile.exists()) {
+        // Inject bootstrap.py, the modules it imports and the server module it hands over to
+        val bootstrapFiles =
+            listOf(
+                "bootstrap.py",
+                "bootstrap_core.py",
+                "bootstrap_provision.py",
+                "bootstrap_supervisor.py",
+                "bootstrap_server.py",
+            ).map { file("src/jvmMain/resources/scripts/$it") }
+                .filter { it.exists() }
+        if (bootstrapFiles.isNotEmpty()) {
             val targetScriptsDir = File(contentDir, "scripts")
             targetScriptsDir.mkdirs()
             copy {
-                from(bootstrapFile)
+                from(bootstrapFiles)
                 into(targetScriptsDir)
             }
         }
@@ -7,4 +7,5 @@ data class VogonSettings(
     val isFirstBoot: Boolean = true,
     val uvCacheDir: String? = null,
     val modelsDir: String? = null,
+    val keepStandbyInstance: Boolean = false,
 )
@@ -23,7 +23,11 @@ data class VogonConfig(
         val device: String = "auto",
         val microphoneName: String? = null,
         val quantization: String? = null,
-    )
+    ) {
+        /** True when [next] only flips [device] between CPU and GPU, which a warm standby backend covers. */
+        fun isDeviceFlipTo(next: Hardware): Boolean =
+            copy(device = next.device) == next && (device == "cpu") != (next.device == "cpu")
+    }
 
     data class Status(
         val activeDevice: String? = null,
@@ -3,6 +3,7 @@ package ovh.devcraft.vogonpoet.infrastructure
 import io.ktor.client.*
 import io.ktor.client.engine.cio.*
 import io.ktor.client.plugins.websocket.*
+import io.ktor.client.request.*
 import io.ktor.http.*
 import io.ktor.websocket.*
 import kotlinx.coroutines.*
@@ -177,6 +178,7 @@ class BabelfishClient(
 
                 when (type) {
                     "config" -> {
+                        val previous = _config.value
                         val configData = element["data"]
                         if (configData != null) {
                             val config = json.decodeFromJsonElement<Babelfish>(configData)
@@ -184,9 +186,14 @@ class BabelfishClient(
                         }
                         val restartRequired = element["restart_required"]?.jsonPrimitive?.boolean == true
                         if (restartRequired) {
-                            VogonLogger.i("Backend restart required for hardware change")
+                            val next = _config.value
                             scope.launch {
-                                backendRepository.restart()
+                                if (next != null && switchDevice(previous, next)) {
+                                    VogonLogger.i("Switched to the standby backend instance for hardware change")
+                                } else {
+                                    VogonLogger.i("Backend restart required for hardware change")
+                                    backendRepository.restart()
+                                }
                             }
                         }
                     }
@@ -291,6 +298,29 @@ class BabelfishClient(
         logMessage(MessageDirection.Sent, message)
     }
 
+    /**
+     * Moves a supervised backend to its warm standby instance when [next] only flips between CPU and GPU.
+     * Returns false when there is no standby to switch to and the backend has to restart.
+     */
+    private suspend fun switchDevice(
+        previous: VogonConfig?,
+        next: VogonConfig,
+    ): Boolean {
+        // The standby instance only covers a CPU <-> GPU flip; anything else needs a fresh start
+        if (previous == null || !previous.hardware.isDeviceFlipTo(next.hardware)) {
+            return false
+        }
+        val toCpu = next.hardware.device == "cpu"
+        // The bootstrap supervisor listens next to Babelfish and answers 409 when it runs without a standby
+        val supervisorPort = next.server.port.toInt() + 1
+        return try {
+            val response = client.post("http://127.0.0.1:$supervisorPort/switch?device=${if (toCpu) "cpu" else "gpu"}")
+            response.status.isSuccess()
+        } catch (e: Exception) {
+            false
+        }
+    }
+
     private suspend fun <T> requestResponse(
         requestType: String,
         responseType: String,
@@ -228,10 +228,16 @@ class MainViewModel(
     fun saveAndRestart(config: VogonConfig) {
         viewModelScope.launch {
             VogonLogger.i("Saving config and restarting backend...")
+            val previous = babelfishClient.config.value
             _draftConfig.value = config
             try {
                 // Save first
                 babelfishClient.saveConfig(config)
+                if (previous != null && previous.hardware.isDeviceFlipTo(config.hardware)) {
+                    // Babelfish replies with restart_required, and BabelfishClient switches to the standby or restarts
+                    VogonLogger.i("Device change left to the backend's restart_required reply")
+                    return@launch
+                }
                 // Give it a moment to flush the websocket frame before killing the process
                 delay(500)
             } catch (e: Exception) {
@@ -164,4 +164,38 @@ class MainViewModelTest {
             runCurrent()
             assertEquals(null, viewModel.displayedEvent.value)
         }
+
+    @Test
+    fun testSaveAndRestartLeavesDeviceFlipToConfigReply() =
+        runTest {
+            val fakeRepo = FakeBackendRepository()
+            val fakeClient = FakeBabelfishClient()
+            val viewModel = MainViewModel(fakeClient, fakeRepo)
+            val gpuConfig = VogonConfig(hardware = VogonConfig.Hardware(device = "cuda"))
+            fakeClient.saveConfig(gpuConfig)
+
+            runCurrent()
+            viewModel.saveAndRestart(gpuConfig.copy(hardware = gpuConfig.hardware.copy(device = "cpu")))
+            testDispatcher.scheduler.advanceTimeBy(501)
+            runCurrent()
+
+            assertEquals(0, fakeRepo.restartCalled)
+        }
+
+    @Test
+    fun testSaveAndRestartRestartsForOtherChanges() =
+        runTest {
+            val fakeRepo = FakeBackendRepository()
+            val fakeClient = FakeBabelfishClient()
+            val viewModel = MainViewModel(fakeClient, fakeRepo)
+            val config = VogonConfig(hardware = VogonConfig.Hardware(device = "cuda"))
+            fakeClient.saveConfig(config)
+
+            runCurrent()
+            viewModel.saveAndRestart(config.copy(cache = VogonConfig.Cache(cacheDir = "/tmp/uv-cache")))
+            testDispatcher.scheduler.advanceTimeBy(501)
+            runCurrent()
+
+            assertEquals(1, fakeRepo.restartCalled)
+        }
 }
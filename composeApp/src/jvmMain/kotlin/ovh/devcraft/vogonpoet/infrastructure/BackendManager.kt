@@ -548,6 +548,11 @@ object BackendManager {
                         args.add("--models-dir")
                         args.add(it)
                     }
+                    if (settings.keepStandbyInstance) {
+                        // Supervised with a warm CPU instance, so device switches don't reload the model
+                        args.add("--supervise")
+                        args.add("--standby")
+                    }
 
                     val pb = UvExecutor.createProcess(args, backendDir)
                     pb.redirectErrorStream(true)
@@ -583,10 +588,13 @@ object BackendManager {
                     delay(2000)
 
                     if (!process!!.isAlive && detectedBrokenPython && attempt < maxAttempts) {
-                        logVogon("Detected broken Python environment. Cleaning up .venv and retrying...")
-                        val venvDir = File(backendDir, ".venv")
-                        if (venvDir.exists()) {
-                            venvDir.deleteRecursively()
+                        logVogon("Detected broken Python environment. Cleaning up venvs and retrying...")
+                        // .venvs holds the per-hardware-mode slots, .venv is the pre-slot layout
+                        listOf(".venv", ".venvs").forEach { name ->
+                            val venvDir = File(backendDir, name)
+                            if (venvDir.exists()) {
+                                venvDir.deleteRecursively()
+                            }
                         }
                         val uvLock = File(backendDir, "uv.lock")
                         if (uvLock.exists()) {
@@ -250,6 +250,48 @@ fun AdvancedSettingsPanel(
 
                 Spacer(modifier = Modifier.height(8.dp))
 
+                // Warm CPU standby (supervised backend)
+                var keepStandby by remember(nonNullSettings) { mutableStateOf(nonNullSettings.keepStandbyInstance) }
+                Row(
+                    modifier = Modifier.fillMaxWidth(),
+                    horizontalArrangement = Arrangement.SpaceBetween,
+                    verticalAlignment = Alignment.CenterVertically,
+                ) {
+                    Column(modifier = Modifier.weight(1f)) {
+                        Text(
+                            text = "Keep CPU Standby",
+                            style = MaterialTheme.typography.bodyMedium,
+                            color = GruvboxFg0,
+                        )
+                        Text(
+                            text = "Keep a CPU instance loaded next to the GPU one so switching is instant (uses more memory)",
+                            style = MaterialTheme.typography.bodySmall,
+                            color = GruvboxFg0.copy(alpha = 0.6f),
+                        )
+                    }
+                    Switch(
+                        checked = keepStandby,
+                        onCheckedChange = {
+                            keepStandby = it
+                            scope.launch {
+                                SettingsRepository.save(nonNullSettings.copy(keepStandbyInstance = it))
+                                // The supervisor flags are only read at launch
+                                viewModel.restartBackend()
+                            }
+                        },
+                        enabled = isReady,
+                        colors =
+                            SwitchDefaults.colors(
+                                checkedThumbColor = GruvboxGreenDark,
+                                checkedTrackColor = GruvboxGreenDark.copy(alpha = 0.5f),
+                                disabledCheckedThumbColor = GruvboxGreenDark.copy(alpha = 0.5f),
+                                disabledCheckedTrackColor = GruvboxGreenDark.copy(alpha = 0.25f),
+                            ),
+                    )
+                }
+
+                Spacer(modifier = Modifier.height(8.dp))
+
                 // Data Storage Directory
                 Column(verticalArrangement = Arrangement.spacedBy(8.dp)) {
                     Text(
@@ -0,0 +1,2110 @@
+"""
+Stdlib-only building blocks shared by bootstrap.py and the bootstrap server: configuration,
+the startup trace, detection and model caches, venv slots and the Launcher that decides what
+to exec.
+
+Imported rather than run, so it is loaded from its cached bytecode on every warm start.
+"""
+
+import logging
+import sys
+import os
+import subprocess
+import shutil
+import argparse
+import json
+import fnmatch
+import hashlib
+import platform
+import time
+from dataclasses import dataclass, field, asdict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple
+
+if TYPE_CHECKING:
+    from bootstrap_provision import OfflineMirror
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+logger = logging.getLogger("bootstrap")
+
+# --- Configuration ---
+PORT = int(os.environ.get("VOGON_BOOTSTRAP_PORT", "8123"))
+
+# Multilingual Parakeet-TDT v3 (25 languages)
+MODEL_REPO = "istupakov/parakeet-tdt-0.6b-v3-onnx"
+MODEL_DIR_NAME = "nemo-parakeet-tdt-0.6b-v3"
+# Files of MODEL_REPO per variant (the onnx-asr quantization Babelfish loads)
+MODEL_VARIANTS = {
+    "fp32": [
+        "encoder-model.onnx",
+        "decoder_joint-model.onnx",
+        "encoder-model.onnx.data",
+        "config.json",
+        "vocab.txt",
+    ],
+    "int8": [
+        "encoder-model.int8.onnx",
+        "decoder_joint-model.int8.onnx",
+        "config.json",
+        "vocab.txt",
+    ],
+}
+# Babelfish loads the variant named by hardware.quantization, fp32 when unset, and GPUs always
+# run fp32. CPUs below either threshold are only told that int8 would suit them
+CPU_FP32_MIN_CORES = 12
+CPU_FP32_MIN_MEMORY_GB = 16
+# GPU memory the fp32 model takes: its weight files (this estimate until the manifest lists their
+# sizes) plus activations, workspace and runtime context. Smaller GPUs are passed over
+GPU_MODEL_WEIGHTS_MB = 2500
+GPU_MEMORY_OVERHEAD_MB = 1024
+# Share of the chosen GPU's memory Babelfish may use; on unified memory, the share of system RAM
+# the GPU gets (about what Metal recommends as its working set)
+GPU_MEMORY_BUDGET_FRACTION = 0.9
+UNIFIED_MEMORY_GPU_FRACTION = 0.66
+MODEL_MANIFEST_NAME = ".vogon_manifest.json"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Model downloads run over parallel connections; files of at least DOWNLOAD_RANGE_MIN_SIZE
+# are split into byte ranges so a single large shard uses all of them
+DOWNLOAD_CONNECTIONS = int(os.environ.get("VOGON_DOWNLOAD_CONNECTIONS", "4"))
+DOWNLOAD_RANGE_MIN_SIZE = 16 * 1024 * 1024
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_PROGRESS_INTERVAL = 1.0
+# Transfer rate (and so the ETA) is measured over this many recent seconds
+DOWNLOAD_RATE_WINDOW = 5.0
+
+# Number of past bootstrap runs kept in the trace file
+TRACE_MAX_RUNS = 200
+
+# Supervisor mode: restart delays, how long a run must last to count as healthy,
+# and how many quick crashes in a row make it give up (leaving recovery to the app)
+SUPERVISOR_BACKOFF_INITIAL = 0.5
+SUPERVISOR_BACKOFF_MAX = 30.0
+SUPERVISOR_STABLE_SECONDS = 60.0
+SUPERVISOR_MAX_QUICK_CRASHES = 5
+
+# Standby mode: internal ports of the GPU and CPU instances behind the PORT relay
+STANDBY_PORTS = {"gpu": PORT + 2, "cpu": PORT + 3}
+RELAY_BUFFER_SIZE = 64 * 1024
+
+# One venv per hardware mode under babelfish/.venvs, all installed from the shared uv cache;
+# least recently used slots are removed once together they exceed the size cap
+VENV_SLOTS_DIR_NAME = ".venvs"
+VENV_SLOTS_MAX_BYTES = int(os.environ.get("VOGON_VENV_SLOTS_MAX_MB", "8192")) * 1024 * 1024
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+SERVER_SCRIPT = SCRIPT_DIR / "bootstrap_server.py"
+
+UV_CMD = os.environ.get("UV_CMD", "uv")
+
+# onnxruntime wheel per mode; they share the `onnxruntime` module, hence one venv slot per mode
+ORT_PACKAGES = {
+    "cpu": "onnxruntime",
+    "nvidia_win": "onnxruntime-gpu",
+    "nvidia_linux": "onnxruntime-gpu",
+    "amd_linux": "onnxruntime-rocm",
+    "windows_gpu": "onnxruntime-directml",
+    "metal": "onnxruntime",
+}
+
+# Opt-in until Babelfish loads the graphs from VOGON_OPTIMIZED_MODEL_DIR: building them copies the
+# model and opens an ORT session for the mode's provider
+GRAPH_OPTIMIZE = os.environ.get("VOGON_OPTIMIZE_GRAPHS", "").lower() in ("1", "true", "yes", "on")
+# Execution provider the model graphs are pre-optimized for in each mode, and the level they
+# are saved at. Providers that compile nodes into their own kernels (DirectML, CoreML) can't
+# serialize them, so those modes only get the provider-independent basic passes
+ORT_OPTIMIZATION = {
+    "cpu": ("CPUExecutionProvider", "ORT_ENABLE_EXTENDED"),
+    "nvidia_win": ("CUDAExecutionProvider", "ORT_ENABLE_EXTENDED"),
+    "nvidia_linux": ("CUDAExecutionProvider", "ORT_ENABLE_EXTENDED"),
+    "amd_linux": ("ROCMExecutionProvider", "ORT_ENABLE_EXTENDED"),
+    "windows_gpu": ("DmlExecutionProvider", "ORT_ENABLE_BASIC"),
+    "metal": ("CoreMLExecutionProvider", "ORT_ENABLE_BASIC"),
+}
+GRAPH_CACHE_INFO_NAME = "optimized.json"
+
+# Model files are read ahead into the page cache once the hardware mode is known, by a detached
+# worker that keeps going after the exec into Babelfish; at most this share of available RAM
+PREWARM_ENABLED = os.environ.get("VOGON_PREWARM", "1").lower() in ("1", "true", "yes", "on")
+PREWARM_MEMORY_FRACTION = 0.5
+
+# CPU inference gets one thread per physical core of a single NUMA node, minus one core left to
+# the app's UI on machines with at least CPU_RESERVE_MIN_CORES. With VOGON_CPU_AUTOTUNE set, the
+# bootstrap server times the encoder at a few thread counts once and keeps the fastest instead
+CPU_RESERVE_MIN_CORES = 4
+CPU_AUTOTUNE = os.environ.get("VOGON_CPU_AUTOTUNE", "").lower() in ("1", "true", "yes", "on")
+CPU_AUTOTUNE_RUNS = 3
+# Encoder input length for the timing runs, in feature frames (10 ms each)
+CPU_AUTOTUNE_FRAMES = 200
+# A smaller thread count wins if it is within this fraction of the fastest
+CPU_AUTOTUNE_TOLERANCE = 0.05
+# Seconds before a hung timing run is given up on (recorded as a failure, not retried)
+CPU_AUTOTUNE_TIMEOUT = 300
+
+# Bump when detection logic changes so stale cache entries are discarded
+DETECTION_CACHE_VERSION = 3
+
+# pyproject extra installed for each hardware mode
+HW_MODE_EXTRAS = {
+    "cpu": "cpu",
+    "nvidia_win": "nvidia-win",
+    "nvidia_linux": "nvidia-linux",
+    "amd_linux": "amd-linux",
+    "windows_gpu": "windows-gpu",
+    "metal": "cpu",
+}
+
+# Operating systems each hardware mode exists on; pip download resolves markers for this one only
+HW_MODE_PLATFORMS = {
+    "cpu": ("win32", "linux", "darwin"),
+    "nvidia_win": ("win32",),
+    "nvidia_linux": ("linux",),
+    "amd_linux": ("linux",),
+    "windows_gpu": ("win32",),
+    "metal": ("darwin",),
+}
+
+# Offline bundles: wheels plus model files, imported into a local mirror under the cache dir
+BUNDLE_FORMAT_VERSION = 1
+OFFLINE_MIRROR_DIR_NAME = "offline"
+
+
+@lru_cache(maxsize=None)
+def babelfish_dir() -> Path:
+    """Locates the babelfish project: next to scripts/ when bundled, else up the dev tree."""
+    prod_dir = SCRIPT_DIR.parent / "babelfish"
+    if prod_dir.exists():
+        return prod_dir
+
+    logger.info("Prod babelfish dir not found, searching for dev location...")
+    candidate = SCRIPT_DIR
+    # Walk up to find the project root containing 'babelfish'
+    for _ in range(8):  # Check up to 8 levels
+        candidate = candidate.parent
+        if (candidate / "babelfish").is_dir():
+            logger.info(f"Found dev babelfish dir at: {candidate / 'babelfish'}")
+            return candidate / "babelfish"
+    return prod_dir
+
+
+def read_app_config() -> Dict[str, Any]:
+    """Reads babelfish.config.json from the app data dir, returning {} if unavailable."""
+    app_data_dir = os.environ.get("VOGON_APP_DATA_DIR")
+    if not app_data_dir:
+        return {}
+    config_path = Path(app_data_dir) / "babelfish.config.json"
+    if not config_path.exists():
+        return {}
+    try:
+        with open(config_path, "r") as f:
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+class Tracer:
+    """Collects timing spans for one bootstrap run and exports them as a JSON line."""
+
+    def __init__(self, origin: float):
+        self.origin = origin
+        self.started_at = time.time() - (time.perf_counter() - origin)
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, start: float, end: float, **attrs):
+        self.spans.append(
+            {
+                "name": name,
+                "start_ms": round((start - self.origin) * 1000, 1),
+                "duration_ms": round((end - start) * 1000, 1),
+                **attrs,
+            }
+        )
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.add(name, start, time.perf_counter(), status=status, **attrs)
+
+    def summary(self, path: str) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "path": path,
+            "platform": sys.platform,
+            "total_ms": round((time.perf_counter() - self.origin) * 1000, 1),
+            "spans": list(self.spans),
+        }
+
+    def export(self, trace_file: Path, path: str):
+        """Appends this run to the trace file, keeping the most recent TRACE_MAX_RUNS runs."""
+        try:
+            lines = trace_file.read_text().splitlines() if trace_file.exists() else []
+            lines.append(json.dumps(self.summary(path)))
+            tmp_file = trace_file.with_suffix(".tmp")
+            tmp_file.write_text("\n".join(lines[-TRACE_MAX_RUNS:]) + "\n")
+            os.replace(tmp_file, trace_file)
+        except Exception as e:
+            logger.warning(f"Failed to write bootstrap trace: {e}")
+
+    def handoff(self) -> str:
+        """Serializes the run so far for the process that continues it."""
+        return json.dumps(
+            {
+                "started_at": self.started_at,
+                "elapsed_ms": round((time.perf_counter() - self.origin) * 1000, 1),
+                "spans": self.spans,
+            }
+        )
+
+    def resume(self, state: str, process_start: Optional[float] = None):
+        """Continues a run handed over by another process, covering the gap as a 'handoff' span."""
+        data = json.loads(state)
+        origin = time.perf_counter() - (time.time() - data["started_at"])
+        shift = round((self.origin - origin) * 1000, 1)
+        process_start = process_start or self.origin
+        for span in self.spans:
+            span["start_ms"] = round(span["start_ms"] + shift, 1)
+        self.origin = origin
+        self.started_at = data["started_at"]
+        self.spans = data["spans"] + self.spans
+        self.add("handoff", origin + data["elapsed_ms"] / 1000, process_start)
+
+
+# Startup is CPU-bound until the first blocking call, so the CPU time used so far puts the
+# origin at interpreter start: the trace covers interpreter init and compiling bootstrap.py
+TRACER = Tracer(time.perf_counter() - time.process_time())
+
+
+def system_memory(available: bool = False) -> Optional[int]:
+    """Total (or currently available) physical memory in bytes, None if it can't be determined."""
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys if available else status.ullTotalPhys
+        return None
+    if available:
+        # MemAvailable counts reclaimable page cache too, unlike the free page count
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+    try:
+        pages = os.sysconf("SC_AVPHYS_PAGES" if available else "SC_PHYS_PAGES")
+        return os.sysconf("SC_PAGE_SIZE") * pages
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """Expands a kernel CPU list such as "0-3,8-11"."""
+    cpus = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.append(int(part))
+    return cpus
+
+
+def _linux_topology(allowed: List[int]) -> Optional[Dict[str, Any]]:
+    def read(path: str) -> Optional[str]:
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    cores: Dict[Tuple[str, str], List[int]] = {}
+    for cpu in allowed:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        core_id = read(f"{base}/core_id")
+        if core_id is None:
+            return None
+        cores.setdefault((read(f"{base}/physical_package_id") or "0", core_id), []).append(cpu)
+
+    allowed_set = set(allowed)
+    nodes = []
+    for node_dir in sorted(Path("/sys/devices/system/node").glob("node[0-9]*")):
+        cpus = set(parse_cpu_list(read(str(node_dir / "cpulist")) or "")) & allowed_set
+        if cpus:
+            nodes.append(cpus)
+    nodes = nodes or [allowed_set]
+    # Inference threads stay on one node: the one with the most usable cores
+    node = max(nodes, key=lambda cpus: sum(1 for c in cores.values() if c[0] in cpus))
+    return {
+        "logical": len(allowed),
+        "physical": len(cores),
+        "numa_nodes": len(nodes),
+        "cores": sorted(c for c in cores.values() if c[0] in node),
+    }
+
+
+def _windows_topology() -> Optional[Dict[str, Any]]:
+    import ctypes
+    import struct
+
+    kernel32 = ctypes.windll.kernel32
+    relation_all = 0xFFFF
+    size = ctypes.c_ulong(0)
+    kernel32.GetLogicalProcessorInformationEx(relation_all, None, ctypes.byref(size))
+    buffer = ctypes.create_string_buffer(size.value)
+    if not kernel32.GetLogicalProcessorInformationEx(relation_all, buffer, ctypes.byref(size)):
+        return None
+
+    # Records are {Relationship, Size, union}; both the core and the NUMA node variant carry
+    # their first GROUP_AFFINITY {KAFFINITY Mask; WORD Group} at offset 32
+    mask_format = "Q" if ctypes.sizeof(ctypes.c_void_p) == 8 else "I"
+    group_offset = 32 + struct.calcsize(mask_format)
+    cores, nodes = [], []
+    offset = 0
+    while offset < size.value:
+        relationship, record_size = struct.unpack_from("<II", buffer, offset)
+        if relationship in (0, 1):  # RelationProcessorCore, RelationNumaNode
+            (mask,) = struct.unpack_from(f"<{mask_format}", buffer, offset + 32)
+            (group,) = struct.unpack_from("<H", buffer, offset + group_offset)
+            cpus = [group * 64 + bit for bit in range(64) if mask >> bit & 1]
+            (cores if relationship == 0 else nodes).append(cpus)
+        offset += record_size
+    if not cores:
+        return None
+    nodes = [set(cpus) for cpus in nodes] or [{cpu for core in cores for cpu in core}]
+    node = max(nodes, key=lambda cpus: sum(1 for c in cores if c[0] in cpus))
+    return {
+        "logical": sum(len(c) for c in cores),
+        "physical": len(cores),
+        "numa_nodes": len(nodes),
+        "cores": sorted(c for c in cores if c[0] in node),
+    }
+
+
+def _macos_topology() -> Optional[Dict[str, Any]]:
+    import ctypes
+
+    libc = ctypes.CDLL(None)
+
+    def sysctl(name: str) -> Optional[int]:
+        value = ctypes.c_int(0)
+        size = ctypes.c_size_t(ctypes.sizeof(value))
+        if libc.sysctlbyname(name.encode(), ctypes.byref(value), ctypes.byref(size), None, 0):
+            return None
+        return value.value
+
+    physical = sysctl("hw.physicalcpu")
+    if not physical:
+        return None
+    return {
+        "logical": sysctl("hw.logicalcpu") or physical,
+        # Apple silicon: efficiency cores slow a parallel op down to their pace
+        "physical": sysctl("hw.perflevel0.physicalcpu") or physical,
+        "numa_nodes": 1,
+        # No CPU ids to pin threads to on macOS
+        "cores": None,
+    }
+
+
+def cpu_topology() -> Dict[str, Any]:
+    """Physical cores, SMT and NUMA layout of the CPUs this process may run on.
+
+    "cores" lists the logical CPUs of each physical core on the NUMA node inference should use.
+    """
+    topology = None
+    try:
+        if sys.platform == "win32":
+            topology = _windows_topology()
+        elif sys.platform == "darwin":
+            topology = _macos_topology()
+        elif hasattr(os, "sched_getaffinity"):
+            topology = _linux_topology(sorted(os.sched_getaffinity(0)))
+    except Exception as e:
+        logger.warning(f"CPU topology detection failed: {e}")
+    if not topology:
+        logical = os.cpu_count() or 1
+        topology = {"logical": logical, "physical": logical, "numa_nodes": 1, "cores": None}
+    topology["smt"] = topology["logical"] > topology["physical"]
+    return topology
+
+
+@lru_cache(maxsize=None)
+def select_model_variant(hw_mode: str) -> Tuple[str, str]:
+    """The MODEL_VARIANTS entry Babelfish loads for a hardware mode, with the reason for reporting."""
+    requested = str(read_app_config().get("hardware", {}).get("quantization") or "").lower()
+    if hw_mode != "cpu":
+        if requested and requested != "fp32":
+            logger.info(f"Ignoring quantization '{requested}' on GPU, which runs full precision")
+        return "fp32", "GPU"
+    if requested in MODEL_VARIANTS:
+        return requested, "set in config"
+
+    cores = os.cpu_count() or 1
+    memory = system_memory()
+    memory_gb = memory / 1024**3 if memory else 0.0
+    reason = f"CPU, {cores} cores, {memory_gb:.0f} GiB RAM"
+    if cores < CPU_FP32_MIN_CORES or memory_gb < CPU_FP32_MIN_MEMORY_GB:
+        reason += "; set hardware.quantization to int8 for a lighter model"
+    return "fp32", reason
+
+
+def model_variants(hw_mode: str) -> List[str]:
+    """Variants a hardware mode may select, depending on the machine and config."""
+    return list(MODEL_VARIANTS) if hw_mode == "cpu" else ["fp32"]
+
+
+def model_patterns(hw_mode: str) -> List[str]:
+    """Files of MODEL_REPO needed for a hardware mode."""
+    return MODEL_VARIANTS[select_model_variant(hw_mode)[0]]
+
+
+def gpu_model_footprint(models_dir: Path) -> int:
+    """Bytes of GPU memory the fp32 model needs, from the manifest's file sizes when known."""
+    manifest = ModelManifest.load(models_dir / MODEL_DIR_NAME)
+    sizes = [manifest.remote[name]["size"] for name in MODEL_VARIANTS["fp32"] if name in manifest.remote]
+    if len(sizes) == len(MODEL_VARIANTS["fp32"]):
+        weights = sum(sizes)
+    else:
+        weights = GPU_MODEL_WEIGHTS_MB * 1024 * 1024
+    return weights + GPU_MEMORY_OVERHEAD_MB * 1024 * 1024
+
+
+class DetectionCache:
+    """Persists hardware detection results, keyed on a cheap system fingerprint."""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_file = cache_dir / "hw_detection.json"
+
+    @staticmethod
+    def _read_small(path: str) -> Optional[str]:
+        try:
+            with open(path, "r") as f:
+                return f.read().strip()
+        except Exception:
+            return None
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[float]:
+        try:
+            return os.stat(path).st_mtime
+        except Exception:
+            return None
+
+    @classmethod
+    def _driver_fingerprint(cls) -> Dict[str, Any]:
+        """Driver versions, read from files/registry rather than by loading the drivers."""
+        if sys.platform == "linux":
+            return {
+                "nvidia": cls._read_small("/sys/module/nvidia/version"),
+                "amdgpu": cls._read_small("/sys/module/amdgpu/version"),
+                "kfd": os.path.exists("/dev/kfd"),
+            }
+        if sys.platform == "win32":
+            system32 = Path(os.environ.get("SystemRoot", "C:\\Windows")) / "System32"
+            return {
+                "nvcuda": cls._mtime(str(system32 / "nvcuda.dll")),
+                "driver_store": cls._mtime(
+                    str(system32 / "DriverStore" / "FileRepository")
+                ),
+            }
+        if sys.platform == "darwin":
+            return {"mac_ver": platform.mac_ver()[0]}
+        return {}
+
+    @classmethod
+    def _pci_fingerprint(cls) -> Dict[str, Any]:
+        """Identifies the current PCI device list so GPU hot-plug/swaps invalidate the cache."""
+        if sys.platform == "linux":
+            devices_dir = "/sys/bus/pci/devices"
+            try:
+                devices = sorted(os.listdir(devices_dir))
+            except Exception:
+                devices = []
+            return {
+                "mtime": cls._mtime(devices_dir),
+                "devices": hashlib.sha256("\n".join(devices).encode()).hexdigest(),
+            }
+        if sys.platform == "win32":
+            try:
+                import winreg
+
+                with winreg.OpenKey(
+                    winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Enum\PCI"
+                ) as key:
+                    subkeys, _, last_write = winreg.QueryInfoKey(key)
+                    return {"subkeys": subkeys, "mtime": last_write}
+            except Exception:
+                return {}
+        return {}
+
+    @classmethod
+    def fingerprint(cls) -> Dict[str, Any]:
+        # Only the hardware section of the config influences the detection result
+        hardware_config = read_app_config().get("hardware", {})
+        return {
+            "version": DETECTION_CACHE_VERSION,
+            "platform": sys.platform,
+            "machine": platform.machine(),
+            "kernel": platform.release(),
+            "kernel_build": platform.version(),
+            "driver": cls._driver_fingerprint(),
+            "pci": cls._pci_fingerprint(),
+            "config": hashlib.sha256(
+                json.dumps(hardware_config, sort_keys=True).encode()
+            ).hexdigest(),
+        }
+
+    def load(self, fingerprint: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        if not self.cache_file.exists():
+            return None
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except Exception:
+            return None
+        if data.get("fingerprint") != fingerprint:
+            return None
+        return data.get("result")
+
+    def store(
+        self,
+        fingerprint: Dict[str, Any],
+        result: Dict[str, str],
+        report: Optional[Dict[str, Any]] = None,
+    ):
+        payload = {
+            "fingerprint": fingerprint,
+            "result": result,
+            "report": report,
+            "created": time.time(),
+        }
+        try:
+            # Write atomically so a concurrent reader never sees a partial file
+            tmp_file = self.cache_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(payload, indent=2))
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.warning(f"Failed to write detection cache: {e}")
+
+
+def file_digest(path: Path, algorithm: str, prefix: bytes = b"") -> str:
+    digest = hashlib.new(algorithm)
+    digest.update(prefix)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelManifest:
+    """Per-model-directory index of the remote file listing and the locally verified files."""
+
+    def __init__(self, model_dir: Path):
+        self.model_dir = model_dir
+        self.path = model_dir / MODEL_MANIFEST_NAME
+        self.repo_id: Optional[str] = None
+        self.revision: Optional[str] = None
+        # All files in the repo: name -> {size, sha256, blob_id}
+        self.remote: Dict[str, Dict[str, Any]] = {}
+        # Files verified on disk: name -> {size, mtime, sha256, blob_id}
+        self.files: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, model_dir: Path) -> "ModelManifest":
+        manifest = cls(model_dir)
+        if manifest.path.exists():
+            try:
+                data = json.loads(manifest.path.read_text())
+                manifest.repo_id = data.get("repo_id")
+                manifest.revision = data.get("revision")
+                manifest.remote = data.get("remote", {})
+                manifest.files = data.get("files", {})
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable model manifest: {e}")
+        return manifest
+
+    def save(self):
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "repo_id": self.repo_id,
+            "revision": self.revision,
+            "remote": self.remote,
+            "files": self.files,
+        }
+        tmp_file = self.path.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(payload, indent=2))
+        os.replace(tmp_file, self.path)
+
+    def refresh_remote(self, repo_id: str):
+        """Fetches file sizes and hashes from the HF repo metadata (blocking)."""
+        from huggingface_hub import HfApi
+
+        info = HfApi().model_info(repo_id, files_metadata=True)
+        remote = {}
+        for sibling in info.siblings or []:
+            lfs = sibling.lfs
+            remote[sibling.rfilename] = {
+                "size": lfs.size if lfs else sibling.size,
+                "sha256": lfs.sha256 if lfs else None,
+                "blob_id": sibling.blob_id,
+            }
+        self.repo_id = repo_id
+        self.revision = info.sha
+        self.remote = remote
+
+    def required_files(self, allow_patterns: List[str]) -> List[str]:
+        return sorted(
+            name
+            for name in self.remote
+            if any(fnmatch.fnmatch(name, pattern) for pattern in allow_patterns)
+        )
+
+    def is_complete(self, allow_patterns: List[str]) -> bool:
+        required = self.required_files(allow_patterns)
+        return bool(required) and all(self.is_fresh(name) for name in required)
+
+    def is_fresh(self, name: str) -> bool:
+        entry = self.files.get(name)
+        remote = self.remote.get(name)
+        if not entry or not remote:
+            return False
+        if entry.get("sha256") != remote.get("sha256") or entry.get("blob_id") != remote.get("blob_id"):
+            return False
+        try:
+            st = (self.model_dir / name).stat()
+        except OSError:
+            return False
+        return st.st_size == remote["size"] and st.st_mtime == entry.get("mtime")
+
+    def verify_hash(self, name: str) -> bool:
+        remote = self.remote[name]
+        path = self.model_dir / name
+        if remote.get("sha256"):
+            return file_digest(path, "sha256") == remote["sha256"]
+        if remote.get("blob_id"):
+            # Non-LFS files are identified by their git blob hash
+            header = f"blob {path.stat().st_size}\0".encode()
+            return file_digest(path, "sha1", header) == remote["blob_id"]
+        return path.stat().st_size == remote["size"]
+
+    def record(self, name: str):
+        st = (self.model_dir / name).stat()
+        remote = self.remote[name]
+        self.files[name] = {
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "sha256": remote.get("sha256"),
+            "blob_id": remote.get("blob_id"),
+        }
+
+
+class ModelStore:
+    """Content-addressed blob store that model directories link into, so weights are stored once."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.blobs_dir = root / "blobs"
+        self.refs_dir = root / "refs"
+
+    @staticmethod
+    def _user_store_dir() -> Path:
+        if sys.platform == "win32":
+            base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+        elif sys.platform == "darwin":
+            base = Path.home() / "Library" / "Caches"
+        else:
+            base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+        return base / "vogonpoet" / "model-store"
+
+    @staticmethod
+    def _device_of(path: Path) -> Optional[int]:
+        # The store may not exist yet, so look at the nearest existing ancestor
+        for candidate in [path, *path.parents]:
+            try:
+                return candidate.stat().st_dev
+            except OSError:
+                continue
+        return None
+
+    @classmethod
+    def for_models_dir(cls, models_dir: Path) -> "ModelStore":
+        """Picks the store location: explicit override, shared per-user store, or next to the models."""
+        override = os.environ.get("VOGON_MODEL_STORE_DIR")
+        if override:
+            return cls(Path(override))
+        user_store = cls._user_store_dir()
+        # Hardlinks/reflinks only work within one filesystem; otherwise keep blobs beside the models
+        if cls._device_of(user_store) == cls._device_of(models_dir):
+            return cls(user_store)
+        return cls(models_dir / ".store")
+
+    @staticmethod
+    def blob_key(entry: Dict[str, Any]) -> Optional[str]:
+        if entry.get("sha256"):
+            return f"sha256/{entry['sha256']}"
+        if entry.get("blob_id"):
+            return f"gitsha1/{entry['blob_id']}"
+        return None
+
+    def blob_path(self, key: str) -> Path:
+        return self.blobs_dir / key
+
+    def has(self, key: Optional[str], size: int) -> bool:
+        if not key:
+            return False
+        try:
+            return self.blob_path(key).stat().st_size == size
+        except OSError:
+            return False
+
+    @staticmethod
+    def _reflink(src: Path, dst: Path) -> bool:
+        try:
+            if sys.platform == "linux":
+                import fcntl
+
+                FICLONE = 0x40049409
+                with open(src, "rb") as s, open(dst, "wb") as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                return True
+            if sys.platform == "darwin":
+                import ctypes
+
+                libc = ctypes.CDLL("/usr/lib/libSystem.dylib")
+                return libc.clonefile(bytes(src), bytes(dst), 0) == 0
+        except Exception:
+            pass
+        if dst.exists():
+            dst.unlink()
+        return False
+
+    def link_into(self, key: str, dest: Path) -> str:
+        """Materializes a blob at dest via hardlink, reflink, symlink or copy (in that order)."""
+        blob = self.blob_path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".link")
+        if tmp.exists() or tmp.is_symlink():
+            tmp.unlink()
+
+        method = "copy"
+        try:
+            os.link(blob, tmp)
+            method = "hardlink"
+        except OSError:
+            if self._reflink(blob, tmp):
+                method = "reflink"
+            else:
+                try:
+                    os.symlink(blob, tmp)
+                    method = "symlink"
+                except OSError:
+                    shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest)
+        return method
+
+    def adopt(self, path: Path, key: Optional[str]):
+        """Moves a verified file into the store (unless already there) and links it back."""
+        if not key or path.is_symlink():
+            return
+        blob = self.blob_path(key)
+        try:
+            if blob.exists():
+                if blob.samefile(path):
+                    return
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp_blob = blob.with_name(blob.name + ".tmp")
+                try:
+                    os.link(path, tmp_blob)
+                except OSError:
+                    shutil.copyfile(path, tmp_blob)
+                os.replace(tmp_blob, blob)
+                if blob.samefile(path):
+                    return
+            self.link_into(key, path)
+        except Exception as e:
+            # The model directory still holds a valid copy, only deduplication is lost
+            logger.warning(f"Could not add {path.name} to model store: {e}")
+
+    def discard_shared(self, path: Path, key: Optional[str]):
+        """Drops the blob backing path after in-place corruption, so it isn't relinked."""
+        if not key:
+            return
+        blob = self.blob_path(key)
+        try:
+            if blob.exists() and blob.samefile(path):
+                blob.unlink()
+                logger.warning(f"Removed corrupted blob {key} from model store")
+        except OSError:
+            pass
+
+    def _ref_file(self, model_dir: Path) -> Path:
+        digest = hashlib.sha256(str(model_dir.resolve()).encode()).hexdigest()[:16]
+        return self.refs_dir / f"{digest}.json"
+
+    def register(self, model_dir: Path, manifest: "ModelManifest"):
+        """Records which blobs a model directory uses, for garbage collection."""
+        blobs = {}
+        for name, entry in manifest.files.items():
+            key = self.blob_key(entry)
+            if key:
+                blobs[name] = key
+        try:
+            self.refs_dir.mkdir(parents=True, exist_ok=True)
+            payload = {"model_dir": str(model_dir.resolve()), "blobs": blobs}
+            self._ref_file(model_dir).write_text(json.dumps(payload, indent=2))
+        except Exception as e:
+            logger.warning(f"Failed to register model store reference: {e}")
+
+    def gc(self) -> Tuple[int, int]:
+        """Removes blobs no model directory references any more. Returns (blobs, bytes) freed."""
+        live = set()
+        if self.refs_dir.exists():
+            for ref_file in self.refs_dir.glob("*.json"):
+                try:
+                    model_dir = Path(json.loads(ref_file.read_text())["model_dir"])
+                except Exception:
+                    ref_file.unlink()
+                    continue
+                manifest = ModelManifest.load(model_dir)
+                if not manifest.path.exists():
+                    logger.info(f"Dropping stale model store reference to {model_dir}")
+                    ref_file.unlink()
+                    continue
+                # Trust the manifest over the ref file, it reflects what is on disk now
+                for entry in manifest.files.values():
+                    key = self.blob_key(entry)
+                    if key:
+                        live.add(key)
+
+        removed = 0
+        freed = 0
+        if self.blobs_dir.exists():
+            for blob in self.blobs_dir.glob("*/*"):
+                key = f"{blob.parent.name}/{blob.name}"
+                if key in live:
+                    continue
+                try:
+                    size = blob.stat().st_size
+                    blob.unlink()
+                    removed += 1
+                    freed += size
+                except OSError as e:
+                    logger.warning(f"Could not remove blob {key}: {e}")
+        return removed, freed
+
+
+class GraphCache:
+    """Pre-optimized copies of a model directory, next to it, keyed on ORT build, variant, provider and files.
+
+    Each key directory is a complete model directory (graphs plus config and vocab), so
+    Babelfish can load it in place of the original.
+    """
+
+    def __init__(self, model_dir: Path):
+        self.model_dir = model_dir
+        self.root = model_dir.with_name(f".{model_dir.name}.optimized")
+
+    def target(self, hw_mode: str, ort_version: Optional[str]) -> Optional[Path]:
+        """Key directory for the current inputs, None while any of them is unknown."""
+        if not ort_version or hw_mode not in ORT_OPTIMIZATION:
+            return None
+        manifest = ModelManifest.load(self.model_dir)
+        variant = select_model_variant(hw_mode)[0]
+        names = manifest.required_files(MODEL_VARIANTS[variant])
+        if not names or any(name not in manifest.files for name in names):
+            return None
+        provider, level = ORT_OPTIMIZATION[hw_mode]
+        key = {
+            "ort": ort_version,
+            "variant": variant,
+            "provider": provider,
+            "level": level,
+            "files": {
+                name: manifest.files[name].get("sha256") or manifest.files[name].get("blob_id")
+                for name in names
+            },
+        }
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        return self.root / f"{variant}-{provider}-{digest[:16]}"
+
+    @staticmethod
+    def is_built(target: Path) -> bool:
+        # The info file is written last, before the directory is moved into place
+        return (target / GRAPH_CACHE_INFO_NAME).exists()
+
+    def lookup(self, hw_mode: str, ort_version: Optional[str]) -> Optional[Path]:
+        target = self.target(hw_mode, ort_version)
+        return target if target and self.is_built(target) else None
+
+    def prepare(self, hw_mode: str, target: Path) -> Tuple[Path, Dict[str, Any]]:
+        """Stages the non-graph files for target and returns the staging dir and optimizer job."""
+        provider, level = ORT_OPTIMIZATION[hw_mode]
+        staging = target.with_name(f"{target.name}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        names = ModelManifest.load(self.model_dir).required_files(model_patterns(hw_mode))
+        models = []
+        for name in names:
+            source = self.model_dir / name
+            if name.endswith(".onnx"):
+                external = f"{name}.data" if f"{name}.data" in names else None
+                models.append(
+                    {
+                        "name": name,
+                        "source": str(source),
+                        "target": str(staging / name),
+                        "external_data": external,
+                    }
+                )
+            elif not name.endswith(".onnx.data"):
+                try:
+                    os.link(source, staging / name)
+                except OSError:
+                    shutil.copy2(source, staging / name)
+
+        # Basic passes don't depend on the provider, so compiling providers are optimized on CPU
+        if level == "ORT_ENABLE_BASIC":
+            providers = ["CPUExecutionProvider"]
+        else:
+            providers = list(dict.fromkeys([provider, "CPUExecutionProvider"]))
+        return staging, {"level": level, "providers": providers, "models": models}
+
+    def commit(self, staging: Path, target: Path, info: Dict[str, Any]):
+        """Moves a finished staging dir into place, dropping older builds of the same variant and provider."""
+        (staging / GRAPH_CACHE_INFO_NAME).write_text(json.dumps(info, indent=2))
+        # Other variants stay, so switching between fp32 and int8 doesn't rebuild each time
+        for old in self.root.iterdir():
+            if old.name.startswith(f"{info['variant']}-{info['provider']}-") and old not in (staging, target):
+                shutil.rmtree(old, ignore_errors=True)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+
+
+# Run detached with this interpreter: reads the leading bytes of each file into the page cache.
+# Reads rather than WILLNEED hints alone: Linux caps each hint at the readahead window, and
+# macOS and Windows have none. The sequential hint widens that window for the reads
+WARM_SCRIPT = """
+import json, os, sys
+
+buffer = bytearray(int(sys.argv[2]))
+for path, length in json.loads(sys.argv[1]):
+    try:
+        f = open(path, "rb", buffering=0)
+    except OSError:
+        continue
+    with f:
+        try:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, length, os.POSIX_FADV_SEQUENTIAL)
+            while length > 0:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                length -= read
+        except OSError:
+            pass
+"""
+
+
+class PageCacheWarmer:
+    """Reads the files Babelfish loads into the OS page cache ahead of it, within a RAM budget."""
+
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        # (path, leading bytes to warm), largest files first so the budget goes to the weights
+        self.ranges: List[Tuple[str, int]] = []
+
+    def start(self):
+        available = system_memory(available=True) or (system_memory() or 0) // 2
+        remaining = int(available * PREWARM_MEMORY_FRACTION)
+        sizes = []
+        for path in self.paths:
+            try:
+                sizes.append((path.stat().st_size, str(path)))
+            except OSError:
+                continue
+        for size, path in sorted(sizes, reverse=True):
+            length = min(size, remaining)
+            if length <= 0:
+                break
+            self.ranges.append((path, length))
+            remaining -= length
+        if not self.ranges:
+            return
+        logger.debug(
+            f"Prewarming {sum(length for _, length in self.ranges) / 1024**2:.0f} MiB of model files "
+            f"(budget {available * PREWARM_MEMORY_FRACTION / 1024**2:.0f} MiB)"
+        )
+        # A separate process, as this one execs into Babelfish (or the bootstrap server) right
+        # away. Once done it stays a zombie under Babelfish, which holds no memory. Started at
+        # low priority, so even its interpreter startup yields to Babelfish on small machines
+        cmd = [sys.executable, "-I", "-S", "-c", WARM_SCRIPT, json.dumps(self.ranges), str(DOWNLOAD_CHUNK_SIZE)]
+        nice = shutil.which("nice") if sys.platform != "win32" else None
+        subprocess.Popen(
+            [nice, "-n", "10", *cmd] if nice else cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            creationflags=getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0),
+        )
+
+    def residency(self) -> Optional[Tuple[int, int]]:
+        """(resident, total) bytes of the files in the page cache, via mincore; None on Windows."""
+        if sys.platform == "win32":
+            return None
+        import ctypes
+        import mmap
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long
+        ]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+        map_failed = ctypes.c_void_p(-1).value
+        # mincore sets the low bit of a page's byte when it is resident
+        low_bit = bytes(b & 1 for b in range(256))
+        resident = total = 0
+        for path in self.paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                size = os.fstat(fd).st_size
+                if not size:
+                    continue
+                addr = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+                if addr in (None, map_failed):
+                    continue
+                try:
+                    pages = ctypes.create_string_buffer((size + mmap.PAGESIZE - 1) // mmap.PAGESIZE)
+                    if libc.mincore(addr, size, pages) == 0:
+                        resident += min(pages.raw.translate(low_bit).count(1) * mmap.PAGESIZE, size)
+                        total += size
+                finally:
+                    libc.munmap(addr, size)
+            finally:
+                os.close(fd)
+        return resident, total
+
+
+class StageLock:
+    """Cross-process lock around one expensive stage, with a side file for its progress.
+
+    The OS drops the lock when the holder exits, so a crashed bootstrapper never leaves it stale.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.progress_file = path.with_name(path.name + ".progress")
+        self.handle = None
+
+    def try_acquire(self) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self.path, "a+b")
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
+
+    def release(self):
+        if self.handle is None:
+            return
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            self.handle.close()
+            self.handle = None
+
+    def report(self, message: str):
+        """Publishes the holder's latest status for processes waiting on the lock."""
+        try:
+            tmp_file = self.progress_file.with_suffix(".tmp")
+            tmp_file.write_text(
+                json.dumps({"pid": os.getpid(), "time": time.time(), "message": message})
+            )
+            os.replace(tmp_file, self.progress_file)
+        except Exception:
+            pass
+
+    def read_progress(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self.progress_file.read_text())
+        except Exception:
+            return None
+
+
+@dataclass
+class LaunchPlan:
+    """Pre-computed backend launch: venv interpreter, entry point and native library paths."""
+
+    hw_mode: str
+    lock_hash: str
+    interpreter: str
+    entry_point: str
+    venv_dir: str
+    library_paths: List[str] = field(default_factory=list)
+    # Keys the optimized model graphs without globbing site-packages on every start
+    ort_version: Optional[str] = None
+
+    def command(self) -> List[str]:
+        module, _, attr = self.entry_point.partition(":")
+        # Equivalent of the console script, without the uv startup and project resolution.
+        # -c puts the working directory ('') first on sys.path, where a stray module could
+        # shadow Babelfish's imports; the console script doesn't, so drop it (like -P on 3.11+)
+        code = (
+            "import sys; sys.path[:] = [p for p in sys.path if p]; "
+            "import functools, importlib; sys.argv[0] = 'babelfish'; "
+            f"sys.exit(functools.reduce(getattr, {attr!r}.split('.'), importlib.import_module({module!r}))())"
+        )
+        return [self.interpreter, "-c", code]
+
+    def environment(self) -> Dict[str, str]:
+        env = os.environ.copy()
+        env["VIRTUAL_ENV"] = self.venv_dir
+        env["PATH"] = str(Path(self.interpreter).parent) + os.pathsep + env.get("PATH", "")
+        EnvironmentManager.apply_library_paths(env, self.library_paths)
+        return env
+
+
+class EnvironmentManager:
+    def __init__(self, babelfish_dir: Path):
+        self.babelfish_dir = babelfish_dir
+        # Use cache directory for runtime artifacts
+        self.cache_dir = Path(
+            os.environ.get("VOGON_APP_CACHE_DIR", str(babelfish_dir / ".cache"))
+        )
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Fingerprint of the active slot; the app deletes it to force a resync
+        self.marker_file = self.cache_dir / ".last_hw_mode"
+        self.slots_dir = babelfish_dir / VENV_SLOTS_DIR_NAME
+        # Marker, launch plan and native library cache of each slot
+        self.slot_state_dir = self.cache_dir / "slots"
+        self.thread_settings_file = self.cache_dir / "cpu_threads.json"
+        self.d3d12info_dir = self.cache_dir / "d3d12info"
+
+        # One-time cleanup of legacy d3d12info binary artifacts
+        if self.d3d12info_dir.exists():
+            try:
+                shutil.rmtree(self.d3d12info_dir)
+            except Exception:
+                pass
+
+    def venv_dir(self, hw_mode: str) -> Path:
+        """The venv slot of a hardware mode, synced through UV_PROJECT_ENVIRONMENT."""
+        return self.slots_dir / hw_mode
+
+    def slot_file(self, hw_mode: str, name: str) -> Path:
+        return self.slot_state_dir / hw_mode / name
+
+    def launch_plan_file(self, hw_mode: str) -> Path:
+        return self.slot_file(hw_mode, "launch_plan.json")
+
+    def venv_python(self, hw_mode: str) -> Path:
+        if sys.platform == "win32":
+            return self.venv_dir(hw_mode) / "Scripts" / "python.exe"
+        return self.venv_dir(hw_mode) / "bin" / "python"
+
+    def offline_mirror(self) -> "OfflineMirror":
+        from bootstrap_provision import OfflineMirror
+
+        return OfflineMirror(self.cache_dir / OFFLINE_MIRROR_DIR_NAME)
+
+    @staticmethod
+    def _write_atomic(path: Path, text: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_suffix(".tmp")
+        tmp_file.write_text(text)
+        os.replace(tmp_file, path)
+
+    @staticmethod
+    def _read_json(path: Path) -> Dict[str, Any]:
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def read_marker(self, hw_mode: str) -> Dict[str, Any]:
+        """The fingerprint of the slot's last successful sync ({} if none)."""
+        return self._read_json(self.slot_file(hw_mode, "marker.json"))
+
+    def _venv_python_version(self, hw_mode: str) -> Optional[str]:
+        try:
+            for line in (self.venv_dir(hw_mode) / "pyvenv.cfg").read_text().splitlines():
+                key, _, value = line.partition("=")
+                if key.strip() in ("version", "version_info"):
+                    return value.strip()
+        except OSError:
+            pass
+        return None
+
+    def _lock_stat(self) -> Optional[List[float]]:
+        try:
+            st = (self.babelfish_dir / "uv.lock").stat()
+            return [st.st_size, st.st_mtime]
+        except OSError:
+            return None
+
+    def env_fingerprint(self, hw_mode: str, marker: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """What the venv was synced against; the lock hash is reused from marker if uv.lock is untouched."""
+        lock_stat = self._lock_stat()
+        if marker and lock_stat and marker.get("lock_stat") == lock_stat:
+            lock_hash = marker.get("lock_hash")
+        else:
+            lock_hash = self.lock_hash()
+        return {
+            "hw_mode": hw_mode,
+            "lock_hash": lock_hash,
+            "lock_stat": lock_stat,
+            "platform": sys.platform,
+            "machine": platform.machine(),
+            "python": self._venv_python_version(hw_mode),
+        }
+
+    def marker_mismatch(self, hw_mode: str) -> List[str]:
+        """Fingerprint fields that differ from the slot's last successful sync (empty if current)."""
+        if not (self.babelfish_dir / "uv.lock").exists():
+            return ["lock_hash"]
+        marker = self.read_marker(hw_mode)
+        if not marker or not self.marker_file.exists():
+            return ["marker"]
+        current = self.env_fingerprint(hw_mode, marker)
+        if current["python"] is None:
+            return ["venv"]
+        return [
+            key
+            for key in ("hw_mode", "lock_hash", "platform", "machine", "python")
+            if marker.get(key) != current[key]
+        ]
+
+    def check_marker(self, hw_mode: str) -> bool:
+        return not self.marker_mismatch(hw_mode)
+
+    def write_marker(self, hw_mode: str, extra: Optional[str] = None):
+        marker = self.env_fingerprint(hw_mode)
+        marker["extra"] = extra
+        marker["packages"] = self.lock_packages()
+        text = json.dumps(marker, indent=2)
+        self._write_atomic(self.slot_file(hw_mode, "marker.json"), text)
+        self._write_atomic(self.marker_file, text)
+
+    def activate_slot(self, hw_mode: str):
+        """Makes hw_mode the active slot and records its use for eviction; no sync involved."""
+        marker_path = self.slot_file(hw_mode, "marker.json")
+        try:
+            os.utime(marker_path)
+            if self._read_json(self.marker_file).get("hw_mode") != hw_mode:
+                logger.debug(f"Switching to the {hw_mode} venv slot")
+                self._write_atomic(self.marker_file, marker_path.read_text())
+        except OSError as e:
+            logger.warning(f"Could not activate venv slot {hw_mode}: {e}")
+
+    def is_env_current(self, hw_mode: str) -> bool:
+        """Slot fingerprint matches its venv, the platform and the current lockfile."""
+        return self.check_marker(hw_mode)
+
+    def slot_sizes(self) -> Dict[str, int]:
+        """Disk usage of each slot; files hard-linked into several slots are counted once."""
+        if not self.slots_dir.is_dir():
+            return {}
+        seen = set()
+        sizes = {}
+        for slot in sorted(self.slots_dir.iterdir()):
+            if not slot.is_dir():
+                continue
+            total = 0
+            for root, _, files in os.walk(slot):
+                for name in files:
+                    try:
+                        st = os.lstat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    if (st.st_dev, st.st_ino) in seen:
+                        continue
+                    seen.add((st.st_dev, st.st_ino))
+                    total += st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+            sizes[slot.name] = total
+        return sizes
+
+    def evict_slots(self, keep: str, max_bytes: int = VENV_SLOTS_MAX_BYTES) -> List[str]:
+        """Removes least recently used slots other than keep until all slots fit in max_bytes."""
+        sizes = self.slot_sizes()
+        total = sum(sizes.values())
+
+        def last_used(hw_mode: str) -> float:
+            try:
+                return self.slot_file(hw_mode, "marker.json").stat().st_mtime
+            except OSError:
+                return 0.0  # never finished a sync
+
+        evicted = []
+        for hw_mode in sorted((mode for mode in sizes if mode != keep), key=last_used):
+            if total <= max_bytes:
+                break
+            if self.slot_in_use(hw_mode):
+                logger.info(f"Keeping venv slot {hw_mode}, a running Babelfish uses it")
+                continue
+            logger.info(
+                f"Evicting venv slot {hw_mode} ({sizes[hw_mode] // (1024 * 1024)} MB), "
+                f"slots exceed {max_bytes // (1024 * 1024)} MB"
+            )
+            # State first, so a partly removed venv is never trusted
+            shutil.rmtree(self.slot_state_dir / hw_mode, ignore_errors=True)
+            shutil.rmtree(self.venv_dir(hw_mode), ignore_errors=True)
+            total -= sizes[hw_mode]
+            evicted.append(hw_mode)
+        return evicted
+
+    def claim_slot(self, hw_mode: str) -> Optional[StageLock]:
+        """Marks the slot as in use until this process, or the Babelfish it execs into, exits."""
+        lock = StageLock(self.slot_file(hw_mode, "running") / f"{os.getpid()}.lock")
+        try:
+            if not lock.try_acquire():
+                return None
+            # Kept open across os.execve, so the lock lives as long as Babelfish
+            os.set_inheritable(lock.handle.fileno(), True)
+        except OSError as e:
+            logger.warning(f"Could not mark venv slot {hw_mode} as in use: {e}")
+            return None
+        return lock
+
+    def slot_in_use(self, hw_mode: str) -> bool:
+        """True if a running Babelfish holds one of the slot's claims; stale claims are removed."""
+        in_use = False
+        for path in sorted(self.slot_file(hw_mode, "running").glob("*.lock")):
+            lock = StageLock(path)
+            try:
+                if not lock.try_acquire():
+                    in_use = True
+                    continue
+            except OSError:
+                continue
+            lock.release()
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        return in_use
+
+    def remove_legacy_venv(self):
+        """Drops the single pre-slot .venv of a bundled install; dev checkouts keep theirs."""
+        legacy = self.babelfish_dir / ".venv"
+        if legacy.is_dir() and self.babelfish_dir == SCRIPT_DIR.parent / "babelfish":
+            logger.info("Removing the legacy .venv, environments now live in per-mode slots")
+            shutil.rmtree(legacy, ignore_errors=True)
+
+    def lock_packages(self) -> Dict[str, str]:
+        """Package name -> version (plus source) pinned by uv.lock; {} if it can't be parsed."""
+        try:
+            import tomllib
+
+            with open(self.babelfish_dir / "uv.lock", "rb") as f:
+                lock = tomllib.load(f)
+        except Exception:
+            return {}
+        packages = {}
+        for package in lock.get("package", []):
+            source = package.get("source", {})
+            origin = next((f"{k}={v}" for k, v in sorted(source.items()) if k != "registry"), "")
+            packages[package.get("name", "")] = package.get("version", "") + (
+                f" ({origin})" if origin else ""
+            )
+        return packages
+
+    @staticmethod
+    def package_diff(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, List[str]]:
+        return {
+            "added": sorted(name for name in new if name not in old),
+            "removed": sorted(name for name in old if name not in new),
+            "changed": sorted(
+                f"{name} {old[name]} -> {new[name]}"
+                for name in new
+                if name in old and old[name] != new[name]
+            ),
+        }
+
+    async def provision_model(
+        self,
+        repo_id: str,
+        dest_dir: Path,
+        allow_patterns: List[str],
+        status_callback=None,
+        store: Optional["ModelStore"] = None,
+        progress_callback=None,
+    ):
+        manifest = ModelManifest.load(dest_dir)
+
+        # Warm start: size+mtime check against the manifest, no network or hashing
+        with TRACER.span("model_check"):
+            complete = manifest.repo_id == repo_id and manifest.is_complete(allow_patterns)
+        if complete:
+            return
+
+        if status_callback:
+            await status_callback(f"Verifying model files for {repo_id}...")
+
+        import asyncio
+        from bootstrap_provision import DownloadEngine, OfflineMirror
+
+        loop = asyncio.get_running_loop()
+        # An imported bundle stands in for the Hub: its listing here, its files in the store
+        listing = self.offline_mirror().model_listing(repo_id)
+        offline = bool(listing) or OfflineMirror.forced()
+        if listing:
+            manifest.repo_id = repo_id
+            manifest.revision = listing["revision"]
+            manifest.remote = listing["remote"]
+            if status_callback:
+                await status_callback("Offline mode: using model files from the local bundle")
+        elif offline:
+            if manifest.repo_id != repo_id or not manifest.remote:
+                raise IOError(f"Offline mode: no listing for {repo_id}, import a bundle first")
+            logger.info("Offline mode: using the recorded model listing")
+        else:
+            try:
+                await loop.run_in_executor(None, manifest.refresh_remote, repo_id)
+            except Exception as e:
+                if manifest.repo_id == repo_id and manifest.remote:
+                    logger.warning(f"Could not refresh model metadata ({e}), using recorded listing")
+                elif dest_dir.exists() and any(dest_dir.glob("*.onnx")):
+                    logger.warning(f"Could not fetch model metadata ({e}), keeping existing model files")
+                    return
+                else:
+                    raise
+
+        required = manifest.required_files(allow_patterns)
+        missing = []
+        for name in required:
+            if manifest.is_fresh(name):
+                continue
+            path = dest_dir / name
+            remote = manifest.remote[name]
+            if path.exists() and path.stat().st_size == remote["size"]:
+                # Unknown provenance (older install or modified file): hash once before trusting it
+                if await loop.run_in_executor(None, manifest.verify_hash, name):
+                    if store:
+                        await loop.run_in_executor(None, store.adopt, path, store.blob_key(remote))
+                    manifest.record(name)
+                    continue
+                if store:
+                    store.discard_shared(path, store.blob_key(remote))
+            if store and store.has(store.blob_key(remote), remote["size"]):
+                # Already downloaded for another mode or app install
+                method = await loop.run_in_executor(
+                    None, store.link_into, store.blob_key(remote), path
+                )
+                logger.info(f"Linked {name} from model store ({method})")
+                manifest.record(name)
+                continue
+            missing.append(name)
+        manifest.save()
+        if store:
+            store.register(dest_dir, manifest)
+
+        if not missing:
+            return
+        if offline:
+            raise IOError(f"Offline mode: {', '.join(missing)} not available locally")
+
+        if status_callback:
+            await status_callback(f"Provisioning model from {repo_id}...")
+
+        from huggingface_hub import hf_hub_url
+        from huggingface_hub.utils import build_hf_headers
+
+        def report(progress: Dict[str, Any]):
+            # Called from the download threads
+            message = self.format_download_progress(progress, len(missing))
+            if status_callback:
+                asyncio.run_coroutine_threadsafe(status_callback(message), loop)
+            if progress_callback:
+                asyncio.run_coroutine_threadsafe(progress_callback(progress), loop)
+
+        engine = DownloadEngine(build_hf_headers(), progress=report)
+        jobs = [
+            (hf_hub_url(repo_id, name, revision=manifest.revision), dest_dir / name, manifest.remote[name]["size"])
+            for name in missing
+        ]
+        total = sum(size for _, _, size in jobs)
+        with TRACER.span("download", bytes=total, files=len(jobs), connections=engine.connections):
+            await loop.run_in_executor(None, engine.fetch, jobs)
+        for name in missing:
+            dest = dest_dir / name
+            if not await loop.run_in_executor(None, manifest.verify_hash, name):
+                dest.unlink()
+                raise IOError(f"Checksum mismatch for {name}")
+            if store:
+                await loop.run_in_executor(
+                    None, store.adopt, dest, store.blob_key(manifest.remote[name])
+                )
+            manifest.record(name)
+        manifest.save()
+        if store:
+            store.register(dest_dir, manifest)
+
+    @staticmethod
+    def format_download_progress(progress: Dict[str, Any], files: int) -> str:
+        mib = 1024 * 1024
+        message = (
+            f"Downloading model ({files} files): {progress['bytes_done'] / mib:.1f}/"
+            f"{progress['bytes_total'] / mib:.1f} MiB at {progress['bytes_per_sec'] / mib:.1f} MiB/s"
+        )
+        if progress["eta_s"] is not None and progress["bytes_done"] < progress["bytes_total"]:
+            minutes, seconds = divmod(int(progress["eta_s"]), 60)
+            message += f", ETA {minutes}:{seconds:02d}"
+        return message
+
+    def _library_cache_key(self, hw_mode: str) -> Dict[str, Any]:
+        """Identifies the installed native wheels by their RECORD files, without walking them."""
+        records = {}
+        site_packages = self._site_packages(hw_mode)
+        if site_packages:
+            for record in site_packages.glob("*.dist-info/RECORD"):
+                dist = record.parent.name.lower()
+                if dist.startswith(("nvidia", "onnxruntime")):
+                    st = record.stat()
+                    records[record.parent.name] = [st.st_size, st.st_mtime]
+        return {"hw_mode": hw_mode, "lock_hash": self.lock_hash(), "records": records}
+
+    def get_library_paths(self, hw_mode: str) -> List[str]:
+        """Native library directories (ORT CAPI, NVIDIA wheels) the backend needs on its search path."""
+        if hw_mode == "cpu":
+            return []
+
+        key = self._library_cache_key(hw_mode)
+        cache_file = self.slot_file(hw_mode, "native_lib_paths.json")
+        cached = self._read_json(cache_file)
+        if cached.get("key") == key:
+            return cached["paths"]
+
+        libs_paths = self._scan_library_paths(hw_mode)
+        try:
+            payload = {"key": key, "paths": libs_paths}
+            self._write_atomic(cache_file, json.dumps(payload, indent=2))
+        except Exception as e:
+            logger.warning(f"Failed to write native library cache: {e}")
+        return libs_paths
+
+    def _scan_library_paths(self, hw_mode: str) -> List[str]:
+        libs_paths = []
+        site_packages = self._site_packages(hw_mode)
+        if not site_packages:
+            return libs_paths
+
+        # ORT CAPI
+        capi = site_packages / "onnxruntime" / "capi"
+        if capi.is_dir():
+            libs_paths.append(str(capi.resolve()))
+
+        # NVIDIA libraries
+        nv_root = site_packages / "nvidia"
+        if nv_root.is_dir():
+            ext = "*.dll" if sys.platform == "win32" else "*.so*"
+            for path in nv_root.rglob(ext):
+                parent = str(path.parent.resolve())
+                if parent not in libs_paths:
+                    libs_paths.append(parent)
+        return libs_paths
+
+    @staticmethod
+    def apply_library_paths(env: Dict[str, str], libs_paths: List[str]):
+        if not libs_paths:
+            return
+        if sys.platform == "win32":
+            current = env.get("PATH", "")
+            env["PATH"] = ";".join(libs_paths) + ";" + current
+        else:
+            current = env.get("LD_LIBRARY_PATH", "")
+            env["LD_LIBRARY_PATH"] = ":".join(libs_paths) + (
+                ":" + current if current else ""
+            )
+
+    @staticmethod
+    def apply_thread_settings(env: Dict[str, str], settings: Dict[str, Any]):
+        """CPU inference thread counts and pinning; values already set in env take precedence."""
+        threads = str(settings["intra_op"])
+        env.setdefault("OMP_NUM_THREADS", threads)
+        env.setdefault("VOGON_INTRA_OP_THREADS", threads)
+        env.setdefault("VOGON_INTER_OP_THREADS", str(settings["inter_op"]))
+        affinity = settings.get("affinity")
+        if affinity:
+            env.setdefault("VOGON_CPU_AFFINITY", ",".join(map(str, affinity)))
+            env.setdefault("OMP_PLACES", ",".join(f"{{{cpu}}}" for cpu in affinity))
+            env.setdefault("OMP_PROC_BIND", "close")
+
+    @staticmethod
+    def _cpu_fingerprint() -> Dict[str, Any]:
+        # Cheap stand-in for the full topology, which is only re-read when this changes
+        allowed = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+        return {"machine": platform.machine(), "cpu_count": os.cpu_count(), "allowed": allowed}
+
+    @staticmethod
+    def derive_thread_settings(topology: Dict[str, Any], threads: Optional[int] = None) -> Dict[str, Any]:
+        """Thread settings for a topology: threads per physical core unless given (e.g. tuned)."""
+        cores = topology["cores"]
+        usable = len(cores) if cores else topology["physical"]
+        if threads is None:
+            threads = usable - 1 if usable >= CPU_RESERVE_MIN_CORES else usable
+        threads = max(1, threads)
+        affinity = None
+        # Pinning only pays off when it keeps threads off SMT siblings or another NUMA node
+        if cores and (topology["smt"] or topology["numa_nodes"] > 1):
+            if threads <= len(cores):
+                affinity = [core[0] for core in cores[:threads]]
+            else:
+                affinity = [cpu for core in cores for cpu in core][:threads]
+        return {"intra_op": threads, "inter_op": 1, "affinity": affinity}
+
+    def thread_settings(self) -> Dict[str, Any]:
+        """The persisted CPU thread settings, re-derived when the CPUs this process may use change."""
+        fingerprint = self._cpu_fingerprint()
+        data = self._read_json(self.thread_settings_file)
+        if data.get("fingerprint") == fingerprint and "intra_op" in data:
+            return data
+        topology = cpu_topology()
+        data = {
+            "fingerprint": fingerprint,
+            "topology": topology,
+            "source": "topology",
+            **self.derive_thread_settings(topology),
+        }
+        logger.info(
+            f"CPU: {topology['physical']} cores, {topology['logical']} threads, "
+            f"{topology['numa_nodes']} NUMA node(s); using {data['intra_op']} inference threads"
+        )
+        try:
+            self._write_atomic(self.thread_settings_file, json.dumps(data, indent=2))
+        except Exception as e:
+            logger.warning(f"Failed to save CPU thread settings: {e}")
+        return data
+
+    def thread_tuning_key(self, hw_mode: str) -> Dict[str, Any]:
+        return {"variant": select_model_variant(hw_mode)[0], "ort": self.ort_version(hw_mode)}
+
+    def threads_tuned(self, hw_mode: str) -> bool:
+        """True once autotune ran for the current key, whether it succeeded or failed."""
+        settings = self.thread_settings()
+        return (
+            settings["source"] in ("autotune", "autotune-failed")
+            and settings.get("tuned_for") == self.thread_tuning_key(hw_mode)
+        )
+
+    def autotune_threads(self, hw_mode: str, model: Path) -> Dict[str, Any]:
+        """Times model on the CPU at a few thread counts in the slot and persists the best (blocking)."""
+        from bootstrap_provision import CPU_AUTOTUNE_SCRIPT
+
+        settings = self.thread_settings()
+        topology = settings["topology"]
+        usable = len(topology["cores"]) if topology["cores"] else topology["physical"]
+        candidates = {settings["intra_op"], usable, max(1, usable // 2)}
+        if topology["smt"] and topology["cores"]:
+            candidates.add(sum(len(core) for core in topology["cores"]))
+        job = {
+            "model": str(model),
+            "threads": sorted(candidates),
+            "frames": CPU_AUTOTUNE_FRAMES,
+            "runs": CPU_AUTOTUNE_RUNS,
+        }
+        try:
+            try:
+                result = subprocess.run(
+                    [str(self.venv_python(hw_mode)), "-c", CPU_AUTOTUNE_SCRIPT, json.dumps(job)],
+                    env=self.get_env_with_dll_injection(hw_mode),
+                    capture_output=True,
+                    text=True,
+                    timeout=CPU_AUTOTUNE_TIMEOUT,
+                )
+            except subprocess.TimeoutExpired:
+                # Its message would quote the whole command line, script included
+                raise RuntimeError(f"timed out after {CPU_AUTOTUNE_TIMEOUT}s") from None
+            if result.returncode != 0:
+                lines = result.stderr.strip().splitlines()
+                raise RuntimeError(lines[-1] if lines else f"autotune exited with code {result.returncode}")
+            timings = {int(threads): ms for threads, ms in json.loads(result.stdout.splitlines()[-1]).items()}
+        except Exception as e:
+            # Recorded like a result, so later starts stay on the warm path instead of retrying
+            settings.update(self.derive_thread_settings(topology))
+            settings.pop("timings_ms", None)
+            settings.update(source="autotune-failed", tuned_for=self.thread_tuning_key(hw_mode), error=str(e))
+            try:
+                self._write_atomic(self.thread_settings_file, json.dumps(settings, indent=2))
+            except Exception as write_error:
+                logger.warning(f"Failed to save CPU thread settings: {write_error}")
+            raise
+        fastest = min(timings.values())
+        best = min(t for t, ms in timings.items() if ms <= fastest * (1 + CPU_AUTOTUNE_TOLERANCE))
+        logger.info(
+            "CPU autotune: "
+            + ", ".join(f"{t} threads {ms:.1f} ms" for t, ms in sorted(timings.items()))
+            + f"; using {best}"
+        )
+        settings.update(self.derive_thread_settings(topology, best))
+        settings.pop("error", None)
+        settings.update(
+            source="autotune",
+            tuned_for=self.thread_tuning_key(hw_mode),
+            timings_ms={str(t): round(ms, 2) for t, ms in sorted(timings.items())},
+        )
+        self._write_atomic(self.thread_settings_file, json.dumps(settings, indent=2))
+        return settings
+
+    def uv_env(self, hw_mode: str, env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Environment for uv commands that target the slot of hw_mode."""
+        env = dict(os.environ if env is None else env)
+        # Clear VIRTUAL_ENV so uv uses the slot instead of the bootstrap env
+        env.pop("VIRTUAL_ENV", None)
+        env["UV_PROJECT_ENVIRONMENT"] = str(self.venv_dir(hw_mode).resolve())
+        return env
+
+    def get_env_with_dll_injection(self, hw_mode: str) -> Dict[str, str]:
+        env = self.uv_env(hw_mode)
+        self.apply_library_paths(env, self.get_library_paths(hw_mode))
+        return env
+
+    def lock_hash(self) -> Optional[str]:
+        lock_file = self.babelfish_dir / "uv.lock"
+        if not lock_file.exists():
+            return None
+        return file_digest(lock_file, "sha256")
+
+    def _site_packages(self, hw_mode: str) -> Optional[Path]:
+        venv_dir = self.venv_dir(hw_mode)
+        if sys.platform == "win32":
+            candidates = [venv_dir / "Lib" / "site-packages"]
+        else:
+            candidates = sorted(venv_dir.glob("lib/python*/site-packages"))
+        return next((c for c in candidates if c.is_dir()), None)
+
+    def ort_version(self, hw_mode: str) -> Optional[str]:
+        """Version of the slot's onnxruntime wheel, read from its dist-info directory name."""
+        site_packages = self._site_packages(hw_mode)
+        package = ORT_PACKAGES.get(hw_mode)
+        if not site_packages or not package:
+            return None
+        for dist_info in site_packages.glob("onnxruntime*.dist-info"):
+            name, _, version = dist_info.name[: -len(".dist-info")].rpartition("-")
+            if name.lower().replace("_", "-") == package:
+                return version
+        return None
+
+    def _find_entry_point(self, hw_mode: str, script: str) -> Optional[str]:
+        """Reads the console-script target (module:attr) from the installed dist-info metadata."""
+        import configparser
+
+        site_packages = self._site_packages(hw_mode)
+        if not site_packages:
+            return None
+        for entry_points in site_packages.glob("*.dist-info/entry_points.txt"):
+            parser = configparser.ConfigParser(delimiters=("=",))
+            parser.optionxform = str
+            try:
+                parser.read(entry_points)
+            except configparser.Error:
+                continue
+            if parser.has_option("console_scripts", script):
+                return parser.get("console_scripts", script).split("[")[0].strip()
+        return None
+
+    def write_launch_plan(self, hw_mode: str) -> Optional[LaunchPlan]:
+        """Captures everything needed to exec the backend without uv, after a successful sync."""
+        venv_dir = self.venv_dir(hw_mode)
+        interpreter = self.venv_python(hw_mode)
+        entry_point = self._find_entry_point(hw_mode, "babelfish")
+        lock_hash = self.lock_hash()
+        if not interpreter.exists() or not entry_point or not lock_hash:
+            logger.warning("Could not build a launch plan, falling back to uv run")
+            return None
+
+        plan = LaunchPlan(
+            hw_mode=hw_mode,
+            lock_hash=lock_hash,
+            interpreter=str(interpreter),
+            entry_point=entry_point,
+            venv_dir=str(venv_dir.resolve()),
+            library_paths=self.get_library_paths(hw_mode),
+            ort_version=self.ort_version(hw_mode),
+        )
+        try:
+            self._write_atomic(self.launch_plan_file(hw_mode), json.dumps(asdict(plan), indent=2))
+        except Exception as e:
+            logger.warning(f"Failed to write launch plan: {e}")
+        return plan
+
+    def load_launch_plan(self, hw_mode: str) -> Optional[LaunchPlan]:
+        """Returns the slot's stored plan if it was built for the current lockfile."""
+        data = self._read_json(self.launch_plan_file(hw_mode))
+        if not data:
+            return None
+        try:
+            plan = LaunchPlan(**data)
+        except TypeError:
+            return None
+        if plan.hw_mode != hw_mode or not Path(plan.interpreter).exists():
+            return None
+        if plan.lock_hash != self.lock_hash():
+            logger.info("Lockfile changed since the launch plan was written")
+            return None
+        return plan
+
+
+def cpu_requested() -> bool:
+    """True if CPU inference is forced at runtime (not sync time), by env or app config."""
+    if str(os.environ.get("VOGON_FORCE_CPU", "")).lower() in ("1", "true", "yes", "on"):
+        return True
+    return read_app_config().get("hardware", {}).get("device") == "cpu"
+
+
+class Launcher:
+    """Decides what to exec: the warm-start check and the final Babelfish command line."""
+
+    def __init__(
+        self, models_dir: Optional[Path] = None, supervise: bool = False, standby: bool = False
+    ):
+        self.supervise = supervise
+        self.standby = standby
+        self.hw_mode: Optional[str] = None
+        # Detection result of the mode being launched, with the chosen GPU and its memory budget
+        self.hw: Dict[str, str] = {}
+        self.models_dir = models_dir or (babelfish_dir() / "models")
+        self.env_manager = EnvironmentManager(babelfish_dir())
+        self.detection_cache = DetectionCache(self.env_manager.cache_dir)
+        self.warmer: Optional[PageCacheWarmer] = None
+        # Held until exit so slot eviction in other instances skips the slot we run from
+        self.slot_claim: Optional[StageLock] = None
+
+    def build_launch(self, hw: Dict[str, str]) -> Tuple[List[str], Dict[str, str]]:
+        hw_mode = hw["hw_mode"]
+        self.hw_mode = hw_mode
+        self.hw = hw
+        variant, reason = select_model_variant(hw_mode)
+        logger.debug(f"Model variant: {variant} ({reason})")
+        with TRACER.span("env_build"):
+            self.env_manager.activate_slot(hw_mode)
+            return self._build_launch(hw_mode)
+
+    def _build_launch(
+        self, hw_mode: str, port: int = PORT, force_cpu: Optional[bool] = None
+    ) -> Tuple[List[str], Dict[str, str]]:
+        plan = self.env_manager.load_launch_plan(hw_mode)
+        if plan:
+            args = plan.command()
+            launch_env = plan.environment()
+        else:
+            launch_env = self.env_manager.get_env_with_dll_injection(hw_mode)
+            args = [UV_CMD, "run", "--no-sync", "babelfish"]
+        # Use the same PORT for the actual server
+        args.extend(["--port", str(port)])
+        # Informational: Babelfish itself picks the weights from hardware.quantization
+        launch_env["VOGON_MODEL_VARIANT"] = select_model_variant(hw_mode)[0]
+
+        if force_cpu is None:
+            force_cpu = cpu_requested()
+        if force_cpu or hw_mode == "cpu":
+            args.append("--cpu")
+            self.env_manager.apply_thread_settings(launch_env, self.env_manager.thread_settings())
+        elif "device" in self.hw:
+            # Adapter index in the provider's own enumeration (CUDA/HIP device, DXGI adapter)
+            launch_env["VOGON_DEVICE"] = self.hw["device"]
+            if "gpu_memory_mb" in self.hw:
+                launch_env["VOGON_GPU_MEMORY_BUDGET_MB"] = self.hw["gpu_memory_mb"]
+        optimized = self.optimized_model_dir(hw_mode, force_cpu, plan)
+        if optimized:
+            launch_env["VOGON_OPTIMIZED_MODEL_DIR"] = str(optimized)
+        return args, launch_env
+
+    def optimized_model_dir(
+        self, hw_mode: str, force_cpu: bool, plan: Optional[LaunchPlan] = None
+    ) -> Optional[Path]:
+        # Graphs optimized for a GPU provider are only handed to runs on that provider
+        if not GRAPH_OPTIMIZE or (force_cpu and hw_mode != "cpu"):
+            return None
+        ort_version = (plan and plan.ort_version) or self.env_manager.ort_version(hw_mode)
+        return GraphCache(self.models_dir / MODEL_DIR_NAME).lookup(hw_mode, ort_version)
+
+    def prewarm(self, hw_mode: str):
+        """Starts warming the model files Babelfish will load, unless already started."""
+        if not PREWARM_ENABLED:
+            return
+        # The manifest's files, not the optimized graphs, which Babelfish doesn't load (yet)
+        model_dir = self.models_dir / MODEL_DIR_NAME
+        names = ModelManifest.load(model_dir).required_files(model_patterns(hw_mode))
+        paths = [model_dir / name for name in names]
+        if self.warmer and self.warmer.paths == paths:
+            return
+        self.warmer = PageCacheWarmer(paths)
+        with TRACER.span("prewarm_start"):
+            try:
+                self.warmer.start()
+            except Exception as e:
+                logger.warning(f"Could not start model prewarm: {e}")
+
+    def prewarm_handoff(self) -> Optional[str]:
+        """The files already being warmed, for the bootstrap server re-run through uv."""
+        return json.dumps([str(p) for p in self.warmer.paths]) if self.warmer else None
+
+    def resume_prewarm(self, state: str):
+        """Adopts the warmer started before a handoff, so the same files aren't warmed twice."""
+        self.warmer = PageCacheWarmer([Path(p) for p in json.loads(state)])
+
+    def warm_start_launch(self, redetect: bool = False) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """Returns the launch command if nothing needs probing, syncing or downloading."""
+        if redetect:
+            return None
+        hw = self.detection_cache.load(DetectionCache.fingerprint())
+        if not hw:
+            return None
+        hw_mode = hw["hw_mode"]
+        manifest = ModelManifest.load(self.models_dir / MODEL_DIR_NAME)
+        if manifest.repo_id != MODEL_REPO or not manifest.is_complete(model_patterns(hw_mode)):
+            return None
+        # The model is in place: warm it while the environment is checked and the launch built
+        self.prewarm(hw_mode)
+        if not self.env_manager.is_env_current(hw_mode):
+            return None
+        if CPU_AUTOTUNE and hw_mode == "cpu" and not self.env_manager.threads_tuned(hw_mode):
+            logger.info("CPU thread autotune pending")
+            return None
+        return self.build_launch(hw)
+
+    def standby_launches(self) -> Tuple[Optional[Dict[str, Tuple[List[str], Dict[str, str]]]], str]:
+        """GPU and CPU launch commands on internal ports, plus the device to start active."""
+        if not self.standby:
+            return None, "gpu"
+        if self.hw_mode in (None, "cpu"):
+            logger.info("Standby mode needs a GPU environment, running a single instance")
+            return None, "gpu"
+        launches = {
+            device: self._build_launch(self.hw_mode, STANDBY_PORTS[device], force_cpu=device == "cpu")
+            for device in ("gpu", "cpu")
+        }
+        return launches, "cpu" if cpu_requested() else "gpu"
+
+    def exec(self, launch: Tuple[List[str], Dict[str, str]], trace_path: str):
+        launch_args, launch_env = launch
+        attrs = {}
+        if self.warmer:
+            with TRACER.span("prewarm_residency"):
+                residency = self.warmer.residency()
+            if residency and residency[1]:
+                resident, total = residency
+                attrs["model_resident"] = round(resident / total, 3)
+                logger.debug(
+                    f"Model files {resident / total:.0%} resident in page cache at launch "
+                    f"({resident / 1024**2:.0f} of {total / 1024**2:.0f} MiB)"
+                )
+        exec_time = time.perf_counter()
+        TRACER.add("exec", exec_time, exec_time, **attrs)
+        TRACER.export(self.env_manager.cache_dir / "bootstrap_trace.jsonl", trace_path)
+
+        if self.hw_mode:
+            self.slot_claim = self.env_manager.claim_slot(self.hw_mode)
+        os.chdir(babelfish_dir())
+        if self.supervise:
+            from bootstrap_supervisor import Supervisor
+
+            sys.exit(Supervisor(launch, trace_path, *self.standby_launches()).run())
+        if sys.platform == "win32":
+            # subprocess.call is blocking, so the script waits for Babelfish to exit
+            subprocess.call(launch_args, env=launch_env)
+            sys.exit(0)
+        else:
+            # On Linux/Unix, replace the current process
+            os.execvpe(launch_args[0], launch_args, launch_env)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models-dir", type=str)
+    parser.add_argument(
+        "--redetect",
+        action="store_true",
+        help="Ignore the cached hardware detection result and probe again",
+    )
+    parser.add_argument(
+        "--gc-models",
+        action="store_true",
+        help="Remove model store blobs that no model directory references, then exit",
+    )
+    parser.add_argument(
+        "--export-bundle",
+        metavar="ARCHIVE",
+        help="Write an offline bundle (locked wheels and model files) for --bundle-modes, then exit",
+    )
+    parser.add_argument(
+        "--bundle-modes",
+        nargs="+",
+        choices=sorted(mode for mode, platforms in HW_MODE_PLATFORMS.items() if sys.platform in platforms),
+        help="Hardware modes of this OS to include in --export-bundle (default: the detected one)",
+    )
+    parser.add_argument(
+        "--import-bundle",
+        metavar="ARCHIVE",
+        help="Unpack an offline bundle so provisioning needs no network, then exit",
+    )
+    parser.add_argument(
+        "--supervise",
+        action="store_true",
+        default=str(os.environ.get("VOGON_SUPERVISE", "")).lower() in ("1", "true", "yes", "on"),
+        help="Keep running and restart Babelfish if it crashes (also VOGON_SUPERVISE=1)",
+    )
+    parser.add_argument(
+        "--standby",
+        action="store_true",
+        default=str(os.environ.get("VOGON_STANDBY", "")).lower() in ("1", "true", "yes", "on"),
+        help="With --supervise on a GPU: keep a CPU instance warm too (also VOGON_STANDBY=1)",
+    )
+    return parser.parse_args()
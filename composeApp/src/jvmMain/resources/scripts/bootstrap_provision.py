@@ -0,0 +1,546 @@
+"""
+Provisioning helpers used off the warm path: the parallel model downloader, offline bundles,
+and the scripts run in a venv slot to optimize the model graphs and tune CPU threads.
+"""
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+from bootstrap_core import (
+    BUNDLE_FORMAT_VERSION,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_CONNECTIONS,
+    DOWNLOAD_PROGRESS_INTERVAL,
+    DOWNLOAD_RANGE_MIN_SIZE,
+    DOWNLOAD_RATE_WINDOW,
+    DOWNLOAD_RETRIES,
+    HW_MODE_EXTRAS,
+    MODEL_DIR_NAME,
+    MODEL_REPO,
+    MODEL_VARIANTS,
+    SERVER_SCRIPT,
+    UV_CMD,
+    EnvironmentManager,
+    ModelManifest,
+    ModelStore,
+    file_digest,
+    logger,
+    model_variants,
+)
+
+
+# Run with the slot's interpreter, where onnxruntime is installed: saves each graph as ORT
+# leaves it after its optimization passes, moving large initializers to an external data file
+GRAPH_OPTIMIZE_SCRIPT = """
+import json, sys
+import onnxruntime as ort
+
+job = json.loads(sys.argv[1])
+provider = job["providers"][0]
+if provider not in ort.get_available_providers():
+    sys.exit(f"{provider} is not available in onnxruntime {ort.__version__}")
+for model in job["models"]:
+    options = ort.SessionOptions()
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, job["level"])
+    options.optimized_model_filepath = model["target"]
+    if model["external_data"]:
+        options.add_session_config_entry(
+            "session.optimized_model_external_initializers_file_name", model["external_data"]
+        )
+        options.add_session_config_entry(
+            "session.optimized_model_external_initializers_min_size_in_bytes", "1024"
+        )
+    ort.InferenceSession(model["source"], options, providers=job["providers"])
+    print(f"Optimized {model['name']} for {provider}", flush=True)
+"""
+
+
+# Run with the slot's interpreter: median CPU latency of one model at each thread count, with
+# random inputs (batch 1, CPU_AUTOTUNE_FRAMES for the other free dimensions and for lengths)
+CPU_AUTOTUNE_SCRIPT = """
+import json, statistics, sys, time
+import numpy as np
+import onnxruntime as ort
+
+job = json.loads(sys.argv[1])
+dtypes = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+}
+rng = np.random.default_rng(0)
+results = {}
+for threads in job["threads"]:
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    session = ort.InferenceSession(job["model"], options, providers=["CPUExecutionProvider"])
+    feeds = {}
+    for node in session.get_inputs():
+        shape = [
+            dim if isinstance(dim, int) else (1 if axis == 0 else job["frames"])
+            for axis, dim in enumerate(node.shape)
+        ]
+        dtype = dtypes[node.type]
+        if np.issubdtype(dtype, np.integer):
+            feeds[node.name] = np.full(shape, job["frames"], dtype)
+        else:
+            feeds[node.name] = rng.standard_normal(shape).astype(dtype)
+    session.run(None, feeds)
+    times = []
+    for _ in range(job["runs"]):
+        start = time.perf_counter()
+        session.run(None, feeds)
+        times.append(time.perf_counter() - start)
+    results[threads] = statistics.median(times) * 1000
+    print(f"{threads} threads: {results[threads]:.1f} ms", file=sys.stderr, flush=True)
+    del session
+print(json.dumps(results))
+"""
+
+
+class OfflineMirror:
+    """Wheels and a model listing imported from a bundle, used in place of PyPI and Hugging Face."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.wheels_dir = root / "wheels"
+        self.requirements_dir = root / "requirements"
+        try:
+            self.info: Dict[str, Any] = json.loads((root / "bundle.json").read_text())
+        except (OSError, ValueError):
+            self.info = {}
+
+    @staticmethod
+    def forced() -> bool:
+        """VOGON_OFFLINE=1: never touch the network, fail if the mirror lacks something."""
+        return str(os.environ.get("VOGON_OFFLINE", "")).lower() in ("1", "true", "yes", "on")
+
+    def requirements(self, hw_mode: str) -> Path:
+        return self.requirements_dir / f"{hw_mode}.txt"
+
+    def project_wheel(self) -> Optional[Path]:
+        name = self.info.get("project_wheel")
+        return self.wheels_dir / name if name else None
+
+    def covers(self, hw_mode: str, lock_hash: Optional[str]) -> bool:
+        """True if the mirror can install hw_mode; a bundle from another lockfile only when forced."""
+        if hw_mode not in self.info.get("modes", {}) or not self.requirements(hw_mode).exists():
+            return False
+        if self.info.get("lock_hash") != lock_hash:
+            if not self.forced():
+                logger.info("Offline bundle was exported for another uv.lock, not using it")
+                return False
+            logger.warning("Offline bundle was exported for another uv.lock, installing it anyway")
+        return True
+
+    def model_listing(self, repo_id: str) -> Optional[Dict[str, Any]]:
+        model = self.info.get("model") or {}
+        return model if model.get("repo_id") == repo_id else None
+
+    def describe(self) -> str:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.info.get("created", 0)))
+        return f"bundle of {created} ({', '.join(sorted(self.info.get('modes', {})))})"
+
+    @staticmethod
+    def script_dependencies(script: Path) -> List[str]:
+        """Dependencies declared in a script's inline metadata block (PEP 723)."""
+        import tomllib
+
+        block = []
+        inside = False
+        for line in script.read_text().splitlines():
+            if line.strip() == "# /// script":
+                inside = True
+            elif inside and line.strip() == "# ///":
+                break
+            elif inside:
+                block.append(line[2:] if line.startswith("# ") else line.lstrip("#"))
+        return tomllib.loads("\n".join(block)).get("dependencies", [])
+
+    @staticmethod
+    def _run(cmd: List[str], cwd: Path):
+        logger.info(f"Running: {' '.join(cmd)}")
+        ret = subprocess.call(cmd, cwd=cwd)
+        if ret != 0:
+            raise RuntimeError(f"{cmd[0]} {cmd[1]} exited with code {ret}")
+
+    @classmethod
+    def export_bundle(
+        cls, archive: Path, env_manager: "EnvironmentManager", models_dir: Path, modes: List[str]
+    ):
+        """Packs the locked wheels of modes and the local model files into one zip archive."""
+        import tempfile
+        import zipfile
+
+        project_dir = env_manager.babelfish_dir
+        lock_hash = env_manager.lock_hash()
+        if not lock_hash:
+            raise RuntimeError(f"No uv.lock in {project_dir}, run the app online once first")
+
+        # Only variants the local manifest has verified, so the export needs no model download.
+        # The target machine may pick another variant than this one, so include all it could use
+        manifest = ModelManifest.load(models_dir / MODEL_DIR_NAME)
+        if manifest.repo_id != MODEL_REPO:
+            raise RuntimeError(f"No provisioned {MODEL_REPO} model in {models_dir}")
+        model_files = set()
+        for hw_mode in modes:
+            variants = [v for v in model_variants(hw_mode) if manifest.is_complete(MODEL_VARIANTS[v])]
+            if not variants:
+                raise RuntimeError(f"No complete model variant for {hw_mode} in {models_dir}")
+            logger.info(f"Bundling model variants {', '.join(variants)} for {hw_mode}")
+            for variant in variants:
+                model_files.update(manifest.required_files(MODEL_VARIANTS[variant]))
+        model_files = sorted(model_files)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            staging = Path(tmp)
+            wheels_dir = staging / "wheels"
+            requirements_dir = staging / "requirements"
+            requirements_dir.mkdir()
+            export = [UV_CMD, "export", "--frozen", "--no-hashes", "--no-emit-project"]
+            # uv has no download command; pip resolves nothing here (--no-deps), it only fetches
+            pip = [UV_CMD, "run", "--no-project", "--python", sys.executable, "--with", "pip", "python", "-m", "pip"]
+            for hw_mode in modes:
+                requirements = requirements_dir / f"{hw_mode}.txt"
+                cls._run(export + ["--extra", HW_MODE_EXTRAS[hw_mode], "-o", str(requirements)], project_dir)
+                cls._run(
+                    pip + ["download", "--only-binary", ":all:", "--no-deps", "-r", str(requirements), "-d", str(wheels_dir)],
+                    project_dir,
+                )
+            # The bootstrap server's own dependencies, resolved by pip as they have no lockfile
+            server_dependencies = cls.script_dependencies(SERVER_SCRIPT)
+            cls._run(pip + ["download", "--only-binary", ":all:", *server_dependencies, "-d", str(wheels_dir)], project_dir)
+            project_build = staging / "project"
+            cls._run([UV_CMD, "build", "--wheel", "--out-dir", str(project_build)], project_dir)
+            project_wheel = next(project_build.glob("*.whl"), None)
+            if not project_wheel:
+                raise RuntimeError(f"uv build produced no wheel for {project_dir}")
+            os.replace(project_wheel, wheels_dir / project_wheel.name)
+
+            info = {
+                "format": BUNDLE_FORMAT_VERSION,
+                "created": time.time(),
+                "platform": sys.platform,
+                "machine": platform.machine(),
+                "lock_hash": lock_hash,
+                "modes": {hw_mode: HW_MODE_EXTRAS[hw_mode] for hw_mode in modes},
+                "project_wheel": project_wheel.name,
+                "server_dependencies": server_dependencies,
+                "wheels": {
+                    wheel.name: file_digest(wheel, "sha256") for wheel in sorted(wheels_dir.glob("*.whl"))
+                },
+                "model": {
+                    "repo_id": manifest.repo_id,
+                    "revision": manifest.revision,
+                    # Full listing, so a mode that wasn't exported fails clearly rather than partially
+                    "remote": manifest.remote,
+                    "files": model_files,
+                },
+            }
+
+            archive.parent.mkdir(parents=True, exist_ok=True)
+            tmp_archive = archive.with_name(archive.name + ".tmp")
+            # Wheels and weights are already compressed
+            with zipfile.ZipFile(tmp_archive, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+                zf.writestr("bundle.json", json.dumps(info, indent=2))
+                for path in sorted([*wheels_dir.glob("*.whl"), *requirements_dir.glob("*.txt")]):
+                    zf.write(path, path.relative_to(staging).as_posix())
+                for name in model_files:
+                    zf.write(manifest.model_dir / name, f"model/{name}")
+            os.replace(tmp_archive, archive)
+        logger.info(f"Exported offline bundle for {', '.join(modes)} to {archive}")
+
+    @classmethod
+    def import_bundle(cls, archive: Path, root: Path, store: ModelStore) -> "OfflineMirror":
+        """Unpacks wheels into the mirror at root and model files into the store, verifying both."""
+        import zipfile
+
+        staging = root.with_name(root.name + ".tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        with zipfile.ZipFile(archive) as zf:
+            info = json.loads(zf.read("bundle.json"))
+            if info.get("format") != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported bundle format {info.get('format')}")
+            if (info.get("platform"), info.get("machine")) != (sys.platform, platform.machine()):
+                raise ValueError(
+                    f"Bundle was exported for {info.get('platform')}/{info.get('machine')}, "
+                    f"this is {sys.platform}/{platform.machine()}"
+                )
+
+            for member in zf.namelist():
+                if member.startswith(("wheels/", "requirements/")):
+                    zf.extract(member, staging)
+            for name, digest in info.get("wheels", {}).items():
+                if file_digest(staging / "wheels" / name, "sha256") != digest:
+                    raise IOError(f"Checksum mismatch for {name}")
+
+            # Verified with the same hashes as a download, then handed to the store as blobs
+            model = ModelManifest(staging / "model")
+            model.remote = info["model"]["remote"]
+            for name in info["model"]["files"]:
+                entry = model.remote[name]
+                key = store.blob_key(entry)
+                if not key or store.has(key, entry["size"]):
+                    continue
+                zf.extract(f"model/{name}", staging)
+                if not model.verify_hash(name):
+                    raise IOError(f"Checksum mismatch for {name}")
+                blob = store.blob_path(key)
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(model.model_dir / name), str(blob))
+            shutil.rmtree(model.model_dir, ignore_errors=True)
+
+        (staging / "bundle.json").write_text(json.dumps(info, indent=2))
+        shutil.rmtree(root, ignore_errors=True)
+        os.replace(staging, root)
+
+        # The blobs are only linked into a model directory by the first bootstrap; until then this
+        # manifest is their reference, so --gc-models keeps them. It lists files, not copies of them
+        anchor = ModelManifest(root / "model")
+        anchor.repo_id = info["model"]["repo_id"]
+        anchor.revision = info["model"]["revision"]
+        anchor.remote = model.remote
+        anchor.files = {
+            name: {key: model.remote[name].get(key) for key in ("size", "sha256", "blob_id")}
+            for name in info["model"]["files"]
+        }
+        anchor.save()
+        store.register(anchor.model_dir, anchor)
+
+        mirror = cls(root)
+        logger.info(f"Imported offline {mirror.describe()} into {root}")
+        return mirror
+
+
+class DownloadEngine:
+    """Fetches files over parallel HTTP connections, splitting large ones into byte ranges.
+
+    Each file is written to a .part file whose ranges are tracked in a .part.json sidecar,
+    so an interrupted download resumes every range where it stopped.
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        connections: int = DOWNLOAD_CONNECTIONS,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.headers = headers or {}
+        self.connections = max(1, connections)
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.stop = threading.Event()
+        self.transfers: List[Dict[str, Any]] = []
+        self.total = 0
+        self.done = 0
+        self.samples: List[Tuple[float, int]] = []
+        self.last_report = 0.0
+        self.opener = self._build_opener()
+
+    @staticmethod
+    def _build_opener():
+        """urllib opener whose redirects drop the Authorization header when the host changes."""
+        import urllib.request
+        from urllib.parse import urlsplit
+
+        class SameHostAuthRedirectHandler(urllib.request.HTTPRedirectHandler):
+            # Hugging Face answers file requests with a redirect to its CDN, which must not get the token
+            def redirect_request(self, req, fp, code, msg, headers, newurl):
+                new = super().redirect_request(req, fp, code, msg, headers, newurl)
+                if new is not None and urlsplit(newurl).hostname != urlsplit(req.full_url).hostname:
+                    new.remove_header("Authorization")
+                return new
+
+        return urllib.request.build_opener(SameHostAuthRedirectHandler)
+
+    def _open(self, url: str, start: int = 0, end: Optional[int] = None):
+        import urllib.request
+
+        headers = dict(self.headers)
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        return self.opener.open(urllib.request.Request(url, headers=headers), timeout=60)
+
+    def supports_ranges(self, url: str) -> bool:
+        try:
+            with self._open(url, 0, 0) as response:
+                return response.status == 206
+        except Exception:
+            return False
+
+    def _plan(self, url: str, dest: Path, size: int) -> Dict[str, Any]:
+        """Ranges still to fetch for one file, resumed from its sidecar when it matches."""
+        part = dest.with_name(dest.name + ".part")
+        state_file = part.with_name(part.name + ".json")
+        try:
+            state = json.loads(state_file.read_text())
+        except (OSError, ValueError):
+            state = {}
+        transfer = {"url": url, "dest": dest, "part": part, "state_file": state_file, "size": size}
+        if size == 0:
+            # Nothing to request: the empty part file is already the whole download
+            transfer["ranges"] = []
+            part.write_bytes(b"")
+            return transfer
+        if part.exists() and state.get("size") == size:
+            transfer["ranges"] = state["ranges"]
+            return transfer
+
+        # A part file without sidecar comes from a sequential download: resume it as one range
+        offset = part.stat().st_size if part.exists() else 0
+        if offset > size or state:
+            offset = 0
+        count = 1
+        if not offset and size >= DOWNLOAD_RANGE_MIN_SIZE and self.connections > 1 and self.supports_ranges(url):
+            count = min(self.connections, -(-size // DOWNLOAD_RANGE_MIN_SIZE))
+        step = -(-size // count)
+        transfer["ranges"] = [
+            {"start": start, "end": min(start + step, size) - 1, "done": 0}
+            for start in range(0, size, step)
+        ]
+        transfer["ranges"][0]["done"] = offset
+        # Sidecar first: a part file without one would be taken for a sequential download
+        self._save(transfer)
+        with open(part, "r+b" if offset else "wb") as f:
+            f.truncate(size if count > 1 else offset)
+        return transfer
+
+    def _save(self, transfer: Dict[str, Any]):
+        with self.lock:
+            state = json.dumps({"size": transfer["size"], "ranges": transfer["ranges"]})
+        try:
+            tmp_file = transfer["state_file"].with_suffix(".tmp")
+            tmp_file.write_text(state)
+            os.replace(tmp_file, transfer["state_file"])
+        except OSError as e:
+            logger.warning(f"Could not save download state of {transfer['dest'].name}: {e}")
+
+    def _fetch_range(self, transfer: Dict[str, Any], segment: Dict[str, Any]):
+        import http.client
+        import urllib.error
+
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                self._fetch_range_once(transfer, segment)
+                return
+            except (OSError, http.client.HTTPException) as e:
+                fatal = isinstance(e, urllib.error.HTTPError) and e.code < 500
+                if fatal or self.stop.is_set() or attempt == DOWNLOAD_RETRIES:
+                    raise
+                logger.warning(
+                    f"Download of {transfer['dest'].name} bytes {segment['start']}-{segment['end']} "
+                    f"failed ({e}), retrying"
+                )
+                self.stop.wait(2**attempt)
+
+    def _fetch_range_once(self, transfer: Dict[str, Any], segment: Dict[str, Any]):
+        end = segment["end"]
+        position = segment["start"] + segment["done"]
+        if position > end:
+            return
+        split = len(transfer["ranges"]) > 1
+        with self._open(transfer["url"], position, end if split else None) as response:
+            if position and response.status != 206:
+                if split:
+                    raise IOError(f"Server ignored a range request for {transfer['dest'].name}")
+                # Server ignored the resume request, start over
+                with self.lock:
+                    self.done -= segment["done"]
+                    segment["done"] = 0
+                position = 0
+            with open(transfer["part"], "r+b") as f:
+                f.seek(position)
+                while position <= end and not self.stop.is_set():
+                    chunk = response.read(min(DOWNLOAD_CHUNK_SIZE, end + 1 - position))
+                    if not chunk:
+                        raise IOError(
+                            f"Connection closed at byte {position} of {transfer['dest'].name}"
+                        )
+                    f.write(chunk)
+                    position += len(chunk)
+                    with self.lock:
+                        segment["done"] += len(chunk)
+                        self.done += len(chunk)
+                    self._tick()
+
+    def _tick(self, final: bool = False):
+        """Every DOWNLOAD_PROGRESS_INTERVAL: checkpoints the sidecars and reports progress."""
+        now = time.monotonic()
+        with self.lock:
+            if not final and now - self.last_report < DOWNLOAD_PROGRESS_INTERVAL:
+                return
+            self.last_report = now
+        with self.save_lock:
+            for transfer in self.transfers:
+                self._save(transfer)
+        if self.progress:
+            self._report(now)
+
+    def _report(self, now: float):
+        with self.lock:
+            self.samples.append((now, self.done))
+            while len(self.samples) > 2 and now - self.samples[0][0] > DOWNLOAD_RATE_WINDOW:
+                self.samples.pop(0)
+            elapsed = now - self.samples[0][0]
+            rate = (self.done - self.samples[0][1]) / elapsed if elapsed > 0 else 0.0
+            done, total = self.done, self.total
+        self.progress(
+            {
+                "bytes_done": done,
+                "bytes_total": total,
+                "bytes_per_sec": round(rate),
+                "eta_s": round((total - done) / rate, 1) if rate > 0 else None,
+            }
+        )
+
+    def fetch(self, jobs: List[Tuple[str, Path, int]]):
+        """Downloads (url, dest, size) jobs; dest only appears once it is complete."""
+        from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+        transfers = []
+        for url, dest, size in jobs:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            transfers.append(self._plan(url, dest, size))
+        self.transfers = transfers
+        with self.lock:
+            self.total = sum(t["size"] for t in transfers)
+            self.done = sum(r["done"] for t in transfers for r in t["ranges"])
+            self.samples = [(time.monotonic(), self.done)]
+
+        # Largest ranges first, so the long transfers don't start last
+        work = sorted(
+            ((t, r) for t in transfers for r in t["ranges"]),
+            key=lambda item: item[1]["end"] - item[1]["start"] - item[1]["done"],
+            reverse=True,
+        )
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                futures = [pool.submit(self._fetch_range, t, r) for t, r in work]
+                finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in finished:
+                    if future.exception():
+                        self.stop.set()
+                        raise future.exception()
+        finally:
+            self.stop.set()
+            self._tick(final=True)
+
+        for transfer in transfers:
+            part, size = transfer["part"], transfer["size"]
+            if part.stat().st_size != size or any(
+                r["start"] + r["done"] <= r["end"] for r in transfer["ranges"]
+            ):
+                raise IOError(f"Incomplete download of {transfer['dest'].name}")
+            os.replace(part, transfer["dest"])
+            transfer["state_file"].unlink(missing_ok=True)
@@ -0,0 +1,1393 @@
+# /// script
+# dependencies = [
+#   "websockets",
+#   "huggingface-hub",
+# ]
+# ///
+"""
+Bootstrap server: hardware probing, `uv sync` and model provisioning, with progress
+streamed to the client over WebSocket.
+
+Started by bootstrap.py when the warm path doesn't apply, either imported in-process
+or run on its own through `uv run` (see bootstrap.run_server).
+"""
+
+import asyncio
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable, Deque
+
+import websockets
+
+from bootstrap_core import (
+    CPU_AUTOTUNE,
+    GPU_MEMORY_BUDGET_FRACTION,
+    GRAPH_OPTIMIZE,
+    MODEL_DIR_NAME,
+    MODEL_REPO,
+    ORT_OPTIMIZATION,
+    ORT_PACKAGES,
+    PORT,
+    TRACER,
+    UNIFIED_MEMORY_GPU_FRACTION,
+    UV_CMD,
+    DetectionCache,
+    GraphCache,
+    Launcher,
+    ModelStore,
+    StageLock,
+    babelfish_dir,
+    gpu_model_footprint,
+    logger,
+    model_patterns,
+    parse_args,
+    read_app_config,
+    select_model_variant,
+    system_memory,
+)
+from bootstrap_provision import GRAPH_OPTIMIZE_SCRIPT, OfflineMirror
+
+# Command output is sent to the client in batches bounded by time and line count
+STATUS_FLUSH_INTERVAL = 0.25
+STATUS_BATCH_LINES = 50
+STATUS_MAX_PENDING_LINES = 500
+
+# Events kept for clients that connect mid-bootstrap, and per-client send backlog
+STATUS_HISTORY_SIZE = 256
+STATUS_CLIENT_QUEUE_SIZE = 256
+
+# How often a bootstrapper waiting on another instance's stage lock checks on it
+LOCK_POLL_INTERVAL = 0.5
+
+# Per-probe time budget in seconds; a probe that overruns is reported as timed out
+PROBE_TIMEOUTS = {"nvidia": 5.0, "cuda": 5.0, "amd_rocm": 2.0, "metal": 1.0, "gpus": 8.0}
+
+# PCI vendor ids of the GPU makers detection tells apart
+GPU_VENDORS = {0x10DE: "nvidia", 0x1002: "amd", 0x8086: "intel"}
+GPU_VENDOR_NAMES = {"nvidia": "NVIDIA GPU", "amd": "AMD GPU", "intel": "Intel Graphics"}
+
+
+async def run_in_daemon_thread(func, *args):
+    """Runs a blocking call on a daemon thread so a hung driver load can't block exit."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def runner():
+        try:
+            result = func(*args)
+        except Exception as e:
+            loop.call_soon_threadsafe(resolve, None, e)
+        else:
+            loop.call_soon_threadsafe(resolve, result, None)
+
+    threading.Thread(target=runner, daemon=True).start()
+    return await future
+
+
+@dataclass
+class ProbeResult:
+    name: str
+    value: Any = None
+    latency_ms: float = 0.0
+    status: str = "ok"
+
+
+@dataclass
+class GpuAdapter:
+    name: str
+    vendor: str
+    # Ordinal in the enumeration that found it: CUDA device, DXGI adapter, or card order per vendor
+    index: int
+    source: str
+    # Bytes the model can use (dedicated VRAM, or the GPU's share of unified memory); None only
+    # when the query failed, as 0 (e.g. an integrated GPU without dedicated VRAM) is too small
+    memory: Optional[int] = None
+
+    def describe(self) -> str:
+        return f"{self.name}, {self.memory / 1024**3:.1f} GiB" if self.memory is not None else self.name
+
+
+@dataclass
+class CapabilityReport:
+    nvidia: bool = False
+    amd_rocm: bool = False
+    metal: bool = False
+    gpus: List[str] = field(default_factory=list)
+    adapters: List[GpuAdapter] = field(default_factory=list)
+    probes: List[ProbeResult] = field(default_factory=list)
+
+    @property
+    def caps(self) -> List[str]:
+        caps = []
+        if self.nvidia:
+            caps.append("NVIDIA")
+        if self.amd_rocm:
+            caps.append("AMD (ROCm)")
+        if self.metal:
+            caps.append("Apple Metal")
+        return caps
+
+
+# --- Windows DXGI Structures for in-process GPU detection ---
+if sys.platform == "win32":
+
+    class GUID(ctypes.Structure):
+        _fields_ = [
+            ("Data1", ctypes.c_uint32),
+            ("Data2", ctypes.c_uint16),
+            ("Data3", ctypes.c_uint16),
+            ("Data4", ctypes.c_uint8 * 8),
+        ]
+
+        def __init__(self, guid_str):
+            import uuid
+
+            g = uuid.UUID(guid_str)
+            self.Data1 = g.time_low
+            self.Data2 = g.time_mid
+            self.Data3 = g.time_hi_version
+            self.Data4 = (ctypes.c_uint8 * 8)(*g.bytes[8:])
+
+    class DXGI_ADAPTER_DESC1(ctypes.Structure):
+        _fields_ = [
+            ("Description", ctypes.c_wchar * 128),
+            ("VendorId", ctypes.c_uint32),
+            ("DeviceId", ctypes.c_uint32),
+            ("SubSysId", ctypes.c_uint32),
+            ("Revision", ctypes.c_uint32),
+            ("DedicatedVideoMemory", ctypes.c_size_t),
+            ("DedicatedSystemMemory", ctypes.c_size_t),
+            ("SharedSystemMemory", ctypes.c_size_t),
+            ("AdapterLuidLow", ctypes.c_uint32),
+            ("AdapterLuidHigh", ctypes.c_int32),
+            ("Flags", ctypes.c_uint32),
+        ]
+
+
+class HardwareDetector:
+    def __init__(
+        self,
+        cache: Optional[DetectionCache] = None,
+        redetect: bool = False,
+        model_footprint: Optional[int] = None,
+    ):
+        self.cache = cache
+        self.redetect = redetect
+        # GPU memory the model needs; GPUs known to have less are not selected
+        self.model_footprint = model_footprint or 0
+
+    @staticmethod
+    def detect_nvidia() -> bool:
+        """Detects NVIDIA GPU presence by checking for libcuda/nvcuda libraries."""
+        lib_name = "nvcuda.dll" if sys.platform == "win32" else "libcuda.so.1"
+        try:
+            # 1. Try direct loading
+            try:
+                ctypes.CDLL(lib_name)
+                return True
+            except Exception:
+                pass
+
+            # 2. Try finding via util
+            found_path = ctypes.util.find_library(lib_name)
+            if found_path:
+                try:
+                    ctypes.CDLL(found_path)
+                    return True
+                except Exception:
+                    pass
+        except Exception:
+            pass
+        return False
+
+    @staticmethod
+    def detect_amd_linux() -> bool:
+        """Detects AMD GPU on Linux by checking for ROCm devices or libraries."""
+        if sys.platform != "linux":
+            return False
+        if os.path.exists("/dev/kfd"):
+            return True
+        try:
+            if ctypes.util.find_library("libhsa-runtime64.so.1"):
+                return True
+        except Exception:
+            pass
+        return False
+
+    @staticmethod
+    def detect_metal() -> bool:
+        """Detects Apple Silicon / Metal support."""
+        if sys.platform != "darwin":
+            return False
+        return os.path.exists("/System/Library/Frameworks/Metal.framework")
+
+    @staticmethod
+    def get_dxgi_adapters() -> List[GpuAdapter]:
+        """Enumerates hardware adapters in-process via DXGI (Windows only, blocking)."""
+        adapters = []
+        try:
+            dxgi = ctypes.windll.dxgi
+            factory_iid = GUID("{7b7166ec-21c7-44ae-b21a-c9ae321ae369}")
+            p_factory = ctypes.c_void_p()
+            if (
+                dxgi.CreateDXGIFactory1(
+                    ctypes.byref(factory_iid), ctypes.byref(p_factory)
+                )
+                == 0
+            ):
+
+                def get_func(obj_ptr, index, argtypes):
+                    vtable = ctypes.cast(
+                        obj_ptr, ctypes.POINTER(ctypes.c_void_p)
+                    )[0]
+                    func_ptr = ctypes.cast(
+                        vtable, ctypes.POINTER(ctypes.c_void_p)
+                    )[index]
+                    return ctypes.WINFUNCTYPE(
+                        ctypes.c_long, ctypes.c_void_p, *argtypes
+                    )(func_ptr)
+
+                for i in range(16):
+                    p_adapter = ctypes.c_void_p()
+                    # EnumAdapters1 index 12
+                    if (
+                        get_func(
+                            p_factory, 12, [ctypes.c_uint32, ctypes.c_void_p]
+                        )(p_factory, i, ctypes.byref(p_adapter))
+                        != 0
+                    ):
+                        break
+
+                    desc = DXGI_ADAPTER_DESC1()
+                    # GetDesc1 index 10
+                    if (
+                        get_func(p_adapter, 10, [ctypes.c_void_p])(
+                            p_adapter, ctypes.byref(desc)
+                        )
+                        == 0
+                    ):
+                        # Filter out software renderers (Microsoft Basic Render Driver)
+                        # DXGI_ADAPTER_FLAG_SOFTWARE = 2
+                        if not (desc.Flags & 2):
+                            name = desc.Description.strip()
+                            if name:
+                                adapters.append(
+                                    GpuAdapter(
+                                        name=name,
+                                        vendor=GPU_VENDORS.get(desc.VendorId, "other"),
+                                        # DirectML's device id is this enumeration index
+                                        index=i,
+                                        source="dxgi",
+                                        memory=desc.DedicatedVideoMemory,
+                                    )
+                                )
+
+                    get_func(p_adapter, 2, [])(p_adapter)  # Release
+                get_func(p_factory, 2, [])(p_factory)  # Release
+        except Exception:
+            pass
+        return adapters
+
+    @staticmethod
+    def get_cuda_devices() -> List[GpuAdapter]:
+        """CUDA devices and their memory through the driver API, without NVML (blocking)."""
+        lib_name = "nvcuda.dll" if sys.platform == "win32" else "libcuda.so.1"
+        try:
+            cuda = ctypes.CDLL(lib_name)
+        except OSError:
+            return []
+        if cuda.cuInit(0) != 0:
+            return []
+        count = ctypes.c_int(0)
+        if cuda.cuDeviceGetCount(ctypes.byref(count)) != 0:
+            return []
+        devices = []
+        for ordinal in range(count.value):
+            device = ctypes.c_int(0)
+            name = ctypes.create_string_buffer(256)
+            memory = ctypes.c_size_t(0)
+            if (
+                cuda.cuDeviceGet(ctypes.byref(device), ordinal) != 0
+                or cuda.cuDeviceGetName(name, len(name), device) != 0
+                or cuda.cuDeviceTotalMem_v2(ctypes.byref(memory), device) != 0
+            ):
+                continue
+            devices.append(
+                GpuAdapter(
+                    name=name.value.decode(errors="replace"),
+                    vendor="nvidia",
+                    index=ordinal,
+                    source="cuda",
+                    memory=memory.value,
+                )
+            )
+        return devices
+
+    @staticmethod
+    def get_drm_adapters() -> List[GpuAdapter]:
+        """GPUs under /sys/class/drm (Linux), with VRAM where the driver reports it (amdgpu)."""
+
+        def read(path: Path) -> Optional[str]:
+            try:
+                return path.read_text().strip()
+            except OSError:
+                return None
+
+        cards = sorted(
+            (card for card in Path("/sys/class/drm").glob("card*") if card.name[4:].isdigit()),
+            key=lambda card: int(card.name[4:]),
+        )
+        adapters = []
+        per_vendor: Dict[str, int] = {}
+        for card in cards:
+            device = card / "device"
+            vendor_id = read(device / "vendor")
+            if not vendor_id:
+                continue
+            vendor = GPU_VENDORS.get(int(vendor_id, 16), "other")
+            vram = read(device / "mem_info_vram_total")
+            # ROCm numbers AMD GPUs in card order, so the per-vendor position is the HIP device
+            index = per_vendor.get(vendor, 0)
+            per_vendor[vendor] = index + 1
+            adapters.append(
+                GpuAdapter(
+                    name=read(device / "product_name") or GPU_VENDOR_NAMES.get(vendor, "GPU"),
+                    vendor=vendor,
+                    index=index,
+                    source="drm",
+                    memory=int(vram) if vram and vram.isdigit() else None,
+                )
+            )
+        return adapters
+
+    @staticmethod
+    async def _probe_output(cmd: List[str], env: Optional[Dict[str, str]] = None) -> str:
+        """Runs a probe command without blocking the loop; the child is killed if the probe is cancelled."""
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env
+        )
+        try:
+            out, _ = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        return out.decode(errors="replace")
+
+    @classmethod
+    async def get_all_gpus(cls) -> List[GpuAdapter]:
+        """Lists GPUs with their memory: DXGI (WMI fallback) on Windows, sysfs (lspci fallback)
+        on Linux, and the unified memory GPU on macOS."""
+        gpus = []
+        try:
+            if sys.platform == "win32":
+                # 1. Prefer DXGI for consistency with the backend
+                adapters = await run_in_daemon_thread(cls.get_dxgi_adapters)
+                if adapters:
+                    return adapters
+
+                # Fallback to powershell
+                out = await cls._probe_output(
+                    [
+                        "powershell",
+                        "-Command",
+                        "Get-CimInstance Win32_VideoController | Select-Object -ExpandProperty Name",
+                    ]
+                )
+                for line in out.strip().split("\n"):
+                    name = line.strip()
+                    if name:
+                        gpus.append(name)
+            elif sys.platform == "darwin":
+                if cls.detect_metal():
+                    memory = system_memory()
+                    share = int(memory * UNIFIED_MEMORY_GPU_FRACTION) if memory else None
+                    return [GpuAdapter("Apple GPU (unified memory)", "apple", 0, "unified", share)]
+            elif sys.platform == "linux":
+                adapters = cls.get_drm_adapters()
+                if adapters:
+                    return adapters
+                if shutil.which("lspci"):
+                    # Force English output for lspci
+                    env = os.environ.copy()
+                    env["LC_ALL"] = "C"
+                    out = (await cls._probe_output(["lspci"], env=env)).lower()
+                    for line in out.split("\n"):
+                        if "vga" in line or "3d controller" in line:
+                            if "nvidia" in line:
+                                gpus.append("NVIDIA GPU")
+                            elif "amd" in line or "ati" in line:
+                                gpus.append("AMD GPU")
+                            elif "intel" in line:
+                                gpus.append("Intel Graphics")
+        except Exception:
+            pass
+        # Names only (WMI, lspci): indexes follow vendor order, memory is unknown
+        adapters = []
+        for name in gpus:
+            vendor = next((v for v in GPU_VENDOR_NAMES if v in name.lower()), "other")
+            index = sum(1 for a in adapters if a.vendor == vendor)
+            adapters.append(GpuAdapter(name, vendor, index, "names"))
+        return adapters
+
+    @staticmethod
+    async def _run_probe(name: str, probe) -> ProbeResult:
+        start = time.perf_counter()
+        value = None
+        status = "ok"
+        try:
+            value = await asyncio.wait_for(probe, PROBE_TIMEOUTS[name])
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception as e:
+            status = f"error: {e}"
+        end = time.perf_counter()
+        TRACER.add(f"probe:{name}", start, end, status=status)
+        latency_ms = round((end - start) * 1000, 1)
+        return ProbeResult(name=name, value=value, latency_ms=latency_ms, status=status)
+
+    async def probe_all(self) -> CapabilityReport:
+        """Runs every probe concurrently and merges the results into a single report."""
+        probes = await asyncio.gather(
+            self._run_probe("nvidia", run_in_daemon_thread(self.detect_nvidia)),
+            self._run_probe("cuda", run_in_daemon_thread(self.get_cuda_devices)),
+            self._run_probe("amd_rocm", run_in_daemon_thread(self.detect_amd_linux)),
+            self._run_probe("metal", run_in_daemon_thread(self.detect_metal)),
+            self._run_probe("gpus", self.get_all_gpus()),
+        )
+        results = {probe.name: probe for probe in probes}
+        return CapabilityReport(
+            nvidia=results["nvidia"].value is True,
+            amd_rocm=results["amd_rocm"].value is True,
+            metal=results["metal"].value is True,
+            gpus=list(dict.fromkeys(a.name for a in results["gpus"].value or [])),
+            adapters=(results["gpus"].value or []) + (results["cuda"].value or []),
+            probes=list(probes),
+        )
+
+    def cached_mode(self) -> Optional[Dict[str, str]]:
+        """Returns the cached detection result without probing, if still valid."""
+        if self.cache is None or self.redetect:
+            return None
+        return self.cache.load(DetectionCache.fingerprint())
+
+    async def get_best_mode(self) -> Dict[str, str]:
+        """Returns the target mode, reusing the cached result when the system is unchanged."""
+        if self.cache is None:
+            return (await self._probe_best_mode())[0]
+
+        fingerprint = DetectionCache.fingerprint()
+        if not self.redetect:
+            cached = self.cache.load(fingerprint)
+            if cached:
+                logger.info(f"Hardware Detection: using cached result ({cached['hw_mode']})")
+                return cached
+
+        result, report = await self._probe_best_mode()
+        # An incomplete report must not pin a possibly-degraded mode for later launches
+        if all(p.status == "ok" for p in report.probes):
+            self.cache.store(fingerprint, result, asdict(report))
+        return result
+
+    async def _probe_best_mode(self) -> Tuple[Dict[str, str], CapabilityReport]:
+        report = await self.probe_all()
+        latencies = ", ".join(
+            f"{p.name}={p.latency_ms}ms ({p.status})" for p in report.probes
+        )
+        adapters = "; ".join(f"{a.source}:{a.index} {a.describe()}" for a in report.adapters)
+        logger.info(f"Hardware Detection: Caps={report.caps}, GPUs={report.gpus}")
+        logger.info(f"GPU adapters: {adapters or 'none'}")
+        logger.info(f"Hardware Probes: {latencies}")
+        return self.select_mode(report, self.model_footprint), report
+
+    @staticmethod
+    def pick_adapter(
+        adapters: List[GpuAdapter], footprint: int, requested: Optional[int] = None
+    ) -> Optional[GpuAdapter]:
+        """The requested adapter if present, else the one with the most memory among those that
+        can hold the model (unknown memory counts as enough). None if every one is too small."""
+        if requested is not None:
+            match = next((a for a in adapters if a.index == requested), None)
+            if match:
+                return match
+        fitting = [a for a in adapters if a.memory is None or a.memory >= footprint]
+        return max(fitting, key=lambda a: (a.memory or 0, -a.index), default=None)
+
+    @staticmethod
+    def with_adapter(mode: Dict[str, str], adapter: Optional[GpuAdapter]) -> Dict[str, str]:
+        """Adds the chosen adapter's index and memory budget, which Babelfish gets at launch."""
+        if adapter is None:
+            return mode
+        mode = {**mode, "device": str(adapter.index), "desc": f"{mode['desc']}: {adapter.describe()}"}
+        if adapter.memory:
+            budget = int(adapter.memory * GPU_MEMORY_BUDGET_FRACTION)
+            mode["gpu_memory_mb"] = str(budget // (1024 * 1024))
+        return mode
+
+    @staticmethod
+    def select_mode(report: CapabilityReport, footprint: int = 0) -> Dict[str, str]:
+        detected_caps = report.caps
+        all_gpu_names = report.gpus
+
+        # Check for user preference in config (specifically for DML vs CUDA on Windows)
+        config_device = read_app_config().get("hardware", {}).get("device", "auto")
+        # An explicit adapter index (e.g. "cuda:1", "dml:0") wins over the memory ranking
+        _, _, index = config_device.partition(":")
+        requested = int(index) if index.isdigit() else None
+
+        # GPUs passed over because the model doesn't fit in their memory
+        skipped: List[GpuAdapter] = []
+
+        def choose(candidates: List[GpuAdapter]) -> Tuple[bool, Optional[GpuAdapter]]:
+            """Whether the mode is usable, and on which adapter (None when none was enumerated)."""
+            if not candidates:
+                return True, None
+            adapter = HardwareDetector.pick_adapter(candidates, footprint, requested)
+            if adapter is None:
+                skipped.extend(candidates)
+                return False, None
+            return True, adapter
+
+        cuda_gpus = [a for a in report.adapters if a.source == "cuda"]
+        windows_gpus = [a for a in report.adapters if a.source in ("dxgi", "names")]
+        amd_gpus = [a for a in report.adapters if a.vendor == "amd" and a.source in ("drm", "names")]
+        unified_gpus = [a for a in report.adapters if a.source == "unified"]
+
+        # Hardware-based Auto-detection
+        # We always prefer the best available GPU environment for the hardware,
+        # even if the user currently requested CPU mode in the config.
+        # This avoids re-syncing environments when switching between CPU/GPU.
+        is_nvidia = "NVIDIA" in detected_caps or any(
+            "nvidia" in g.lower() for g in all_gpu_names
+        )
+        is_amd = "AMD (ROCm)" in detected_caps or any(
+            "amd" in g.lower() or "ati" in g.lower() for g in all_gpu_names
+        )
+
+        if is_nvidia:
+            if sys.platform == "win32" and config_device.startswith("dml"):
+                # On Windows, NVIDIA can run either CUDA or DirectML.
+                # DirectML requires a different onnxruntime package.
+                # If the user explicitly requested DML, we must use the windows_gpu environment.
+                usable, adapter = choose(windows_gpus)
+                if usable:
+                    logger.info(f"NVIDIA GPU detected but user requested DirectML ({config_device}). Using windows-gpu extra.")
+                    return HardwareDetector.with_adapter(
+                        {
+                            "hw_mode": "windows_gpu",
+                            "extra": "windows-gpu",
+                            "desc": "NVIDIA GPU (DirectML mode)",
+                        },
+                        adapter,
+                    )
+            else:
+                usable, adapter = choose(cuda_gpus)
+                if usable and sys.platform == "win32":
+                    logger.info("NVIDIA GPU detected. Using nvidia-win extra.")
+                    return HardwareDetector.with_adapter(
+                        {
+                            "hw_mode": "nvidia_win",
+                            "extra": "nvidia-win",
+                            "desc": "NVIDIA GPU",
+                        },
+                        adapter,
+                    )
+                if usable:
+                    logger.info("NVIDIA GPU detected. Using nvidia-linux extra.")
+                    return HardwareDetector.with_adapter(
+                        {
+                            "hw_mode": "nvidia_linux",
+                            "extra": "nvidia-linux",
+                            "desc": "NVIDIA GPU",
+                        },
+                        adapter,
+                    )
+
+        if is_amd:
+            if sys.platform == "win32":
+                usable, adapter = choose(windows_gpus)
+                if usable:
+                    return HardwareDetector.with_adapter(
+                        {
+                            "hw_mode": "windows_gpu",
+                            "extra": "windows-gpu",
+                            "desc": "AMD GPU (DirectML)",
+                        },
+                        adapter,
+                    )
+            else:
+                usable, adapter = choose(amd_gpus)
+                if usable:
+                    return HardwareDetector.with_adapter(
+                        {
+                            "hw_mode": "amd_linux",
+                            "extra": "amd-linux",
+                            "desc": "AMD ROCm GPU",
+                        },
+                        adapter,
+                    )
+
+        # Smart Mac Detection
+        if "Apple Metal" in detected_caps:
+            import platform
+
+            arch = platform.machine().lower()
+            if "arm" in arch or "aarch64" in arch:
+                # Apple Silicon -> CoreML Capable, if its share of unified memory holds the model
+                usable, adapter = choose(unified_gpus)
+                if usable:
+                    return HardwareDetector.with_adapter(
+                        {
+                            "hw_mode": "metal",
+                            "extra": "cpu",
+                            "desc": "Apple Silicon (CoreML capable)",
+                        },
+                        adapter,
+                    )
+            else:
+                # Intel Mac -> Prefer CPU for stability unless forced
+                return {
+                    "hw_mode": "cpu",
+                    "extra": "cpu",
+                    "desc": "Intel Mac (CPU Mode)",
+                }
+
+        if sys.platform == "win32" and all_gpu_names:
+            usable, adapter = choose(windows_gpus)
+            if usable:
+                return HardwareDetector.with_adapter(
+                    {
+                        "hw_mode": "windows_gpu",
+                        "extra": "windows-gpu",
+                        "desc": "Windows Generic GPU (DirectML)",
+                    },
+                    adapter,
+                )
+
+        if skipped:
+            names = ", ".join(dict.fromkeys(a.describe() for a in skipped))
+            reason = f"{names} below the {footprint / 1024**3:.1f} GiB the model needs"
+            logger.info(f"No GPU can hold the model ({reason}), using CPU")
+            return {"hw_mode": "cpu", "extra": "cpu", "desc": f"CPU ({reason})"}
+        return {"hw_mode": "cpu", "extra": "cpu", "desc": "CPU"}
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    deps: List[str] = field(default_factory=list)
+    status: str = "pending"
+    result: Any = None
+    error: Optional[Exception] = None
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class StagePipeline:
+    """Runs bootstrap stages as soon as their dependencies have completed."""
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.origin = time.perf_counter()
+
+    def add(self, name: str, run: Callable[[], Awaitable[Any]], deps: Optional[List[str]] = None):
+        for dep in deps or []:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name=name, run=run, deps=list(deps or []))
+
+    def result(self, name: str) -> Any:
+        return self.stages[name].result
+
+    def failed(self) -> List[Stage]:
+        return [s for s in self.stages.values() if s.status == "failed"]
+
+    async def run(self) -> bool:
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage):
+            if stage.deps:
+                await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+            if any(self.stages[dep].status != "ok" for dep in stage.deps):
+                stage.status = "skipped"
+                return
+            stage.status = "running"
+            stage.started = time.perf_counter()
+            try:
+                stage.result = await stage.run()
+                stage.status = "ok"
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' failed: {e}")
+                stage.error = e
+                stage.status = "failed"
+            finally:
+                stage.finished = time.perf_counter()
+                TRACER.add(
+                    f"stage:{stage.name}", stage.started, stage.finished, status=stage.status
+                )
+
+        # Stages are registered after their dependencies, so insertion order is a valid topological order
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(run_stage(stage))
+        await asyncio.gather(*tasks.values())
+        return all(s.status == "ok" for s in self.stages.values())
+
+    def critical_path(self) -> List[Stage]:
+        """Walks back from the last stage to finish through the dependency that gated it."""
+        finished = [s for s in self.stages.values() if s.finished is not None]
+        if not finished:
+            return []
+        stage = max(finished, key=lambda s: s.finished)
+        path = [stage]
+        while stage.deps:
+            deps = [self.stages[d] for d in stage.deps if self.stages[d].finished is not None]
+            if not deps:
+                break
+            stage = max(deps, key=lambda s: s.finished)
+            path.append(stage)
+        return list(reversed(path))
+
+    def log_timings(self):
+        for stage in self.stages.values():
+            if stage.started is None:
+                logger.info(f"Stage {stage.name}: {stage.status}")
+                continue
+            start = stage.started - self.origin
+            logger.info(
+                f"Stage {stage.name}: {stage.status} "
+                f"(start +{start:.2f}s, took {stage.duration:.2f}s)"
+            )
+        path = self.critical_path()
+        if path:
+            total = path[-1].finished - self.origin
+            chain = " -> ".join(f"{s.name} ({s.duration:.2f}s)" for s in path)
+            logger.info(f"Critical path: {chain} = {total:.2f}s")
+
+
+@dataclass
+class UvProgress:
+    """Structured progress parsed from `uv sync` output."""
+
+    resolved: int = 0
+    downloads_total: int = 0
+    downloads_done: int = 0
+    bytes_total: int = 0
+    bytes_done: int = 0
+    installed: int = 0
+    sizes: Dict[str, int] = field(default_factory=dict)
+
+    _UNITS = {"B": 1, "KiB": 1024, "MiB": 1024**2, "GiB": 1024**3}
+    _RESOLVED = re.compile(r"^Resolved (\d+) packages?")
+    _DOWNLOADING = re.compile(r"^Downloading (\S+) \(([\d.]+)\s*(B|KiB|MiB|GiB)\)")
+    _DOWNLOADED = re.compile(r"^Downloaded (\S+)")
+    _INSTALLED = re.compile(r"^\+ \S+")
+
+    def feed(self, line: str) -> bool:
+        """Updates counters from one output line. Returns True if the line carried progress."""
+        if m := self._RESOLVED.match(line):
+            self.resolved = int(m.group(1))
+        elif m := self._DOWNLOADING.match(line):
+            size = int(float(m.group(2)) * self._UNITS[m.group(3)])
+            self.sizes[m.group(1)] = size
+            self.downloads_total += 1
+            self.bytes_total += size
+        elif m := self._DOWNLOADED.match(line):
+            self.downloads_done += 1
+            self.bytes_done += self.sizes.get(m.group(1), 0)
+        elif self._INSTALLED.match(line):
+            self.installed += 1
+        else:
+            return False
+        return True
+
+    def summary(self) -> Optional[str]:
+        if self.downloads_total and self.downloads_done < self.downloads_total:
+            return (
+                f"Downloading packages {self.downloads_done}/{self.downloads_total} "
+                f"({self.bytes_done / 1024**2:.1f}/{self.bytes_total / 1024**2:.1f} MiB)"
+            )
+        if self.installed:
+            return f"Installed {self.installed} packages"
+        return None
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "resolved": self.resolved,
+            "downloads_done": self.downloads_done,
+            "downloads_total": self.downloads_total,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "installed": self.installed,
+        }
+
+
+class StatusStream:
+    """Coalesces command output into time- or size-bounded batches of status/progress frames."""
+
+    def __init__(
+        self,
+        stage: str,
+        send_update: Callable[[str], Awaitable[None]],
+        send_event: Callable[[Dict[str, Any]], Awaitable[None]],
+    ):
+        self.stage = stage
+        self.send_update = send_update
+        self.send_event = send_event
+        self.progress = UvProgress()
+        # Bounded: if the client falls behind, the oldest lines are dropped rather than queued forever
+        self.pending: Deque[str] = deque(maxlen=STATUS_MAX_PENDING_LINES)
+        self.dropped = 0
+        self.closed = False
+        self.wakeup = asyncio.Event()
+
+    def feed(self, line: str):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(line)
+        self.progress.feed(line)
+        if len(self.pending) >= STATUS_BATCH_LINES:
+            self.wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), STATUS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+            if self.closed and not self.pending:
+                return
+
+    async def flush(self):
+        if not self.pending:
+            return
+        lines = list(self.pending)
+        self.pending.clear()
+        dropped, self.dropped = self.dropped, 0
+
+        logger.info("CMD: " + "\nCMD: ".join(lines))
+        await self.send_update(self.progress.summary() or lines[-1])
+        await self.send_event(
+            {
+                "type": "progress",
+                "stage": self.stage,
+                "lines": lines,
+                "dropped_lines": dropped,
+                **self.progress.as_dict(),
+            }
+        )
+
+
+class StatusHub:
+    """Fans bootstrap events out to every connected client, replaying history to late joiners."""
+
+    def __init__(self, history_size: int = STATUS_HISTORY_SIZE):
+        self.history: Deque[str] = deque(maxlen=history_size)
+        # Progress frames supersede each other, so only the latest per stage is replayed
+        self.latest_progress: Dict[str, str] = {}
+        self.queues: Dict[Any, asyncio.Queue] = {}
+        self.finished: Dict[Any, asyncio.Event] = {}
+
+    def publish(self, payload: Dict[str, Any]):
+        message = json.dumps(payload)
+        if payload.get("type") == "progress":
+            self.latest_progress[payload.get("stage", "")] = message
+        else:
+            self.history.append(message)
+        for websocket, queue in list(self.queues.items()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled client must not hold up the others; it can reconnect and replay
+                logger.warning("Dropping status client that fell behind")
+                self.queues.pop(websocket, None)
+                asyncio.create_task(websocket.close(1013, "Client too slow"))
+
+    def reset(self):
+        """Forgets the previous run's events, so a client of the next run isn't replayed them."""
+        self.history.clear()
+        self.latest_progress.clear()
+
+    async def subscribe(self, websocket):
+        """Streams replayed history, then live events, until the client or the hub closes."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STATUS_CLIENT_QUEUE_SIZE)
+        finished = asyncio.Event()
+        self.queues[websocket] = queue
+        self.finished[websocket] = finished
+        backlog = list(self.history) + list(self.latest_progress.values())
+        try:
+            for message in backlog:
+                await websocket.send(message)
+            while True:
+                message = await queue.get()
+                if message is None:
+                    await websocket.close()
+                    break
+                await websocket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.queues.pop(websocket, None)
+            self.finished.pop(websocket, None)
+            finished.set()
+
+    async def close(self, timeout: float = 5.0):
+        """Lets every client drain its queued events, then closes the connections."""
+        subscribers = list(self.queues.items())
+        waits = [self.finished[websocket].wait() for websocket, _ in subscribers]
+        for websocket, queue in subscribers:
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                asyncio.create_task(websocket.close())
+        if waits:
+            try:
+                await asyncio.wait_for(asyncio.gather(*waits), timeout)
+            except asyncio.TimeoutError:
+                await asyncio.gather(
+                    *(websocket.close() for websocket, _ in subscribers), return_exceptions=True
+                )
+
+    @property
+    def client_count(self) -> int:
+        return len(self.queues)
+
+
+class BootstrapServer:
+    def __init__(self, launcher: Launcher, redetect: bool = False):
+        self.loop = asyncio.get_event_loop()
+        self.hub = StatusHub()
+        self.bootstrap_task: Optional[asyncio.Task] = None
+        # True from the start of a run until it begins closing its clients
+        self.running = False
+        # Set once a run has produced the launch command; Babelfish takes the port over next
+        self.completed = False
+        self.launcher = launcher
+        self.models_dir = launcher.models_dir
+        self.model_store = ModelStore.for_models_dir(self.models_dir)
+        self.env_manager = launcher.env_manager
+        self.detector = HardwareDetector(
+            launcher.detection_cache,
+            redetect=redetect,
+            model_footprint=gpu_model_footprint(self.models_dir),
+        )
+        self.completion_future = None
+
+    def set_completion_future(self, future):
+        self.completion_future = future
+
+    async def handle_connection(self, websocket):
+        if self.completed:
+            # Between the last run and the server closing: the client reconnects to Babelfish
+            await websocket.close(1012, "Bootstrap finished, Babelfish is starting")
+            return
+        # The first client starts the bootstrap; later ones (reconnects, retries) just follow it
+        if not self.running:
+            # After a failed run, the new one starts from a clean history
+            self.hub.reset()
+            self.running = True
+            self.bootstrap_task = asyncio.create_task(self.bootstrap())
+        else:
+            logger.info(f"Client joined running bootstrap ({self.hub.client_count + 1} connected)")
+        await self.hub.subscribe(websocket)
+
+    async def bootstrap(self):
+        try:
+            await self.run_bootstrap()
+        except Exception as e:
+            logger.error(f"Bootstrap failed: {e}")
+            await self.send_update(f"Error: {e}")
+        # Clients disconnect either way; after a failure the next connection starts a fresh run,
+        # including one arriving while this run's clients are still being closed
+        self.running = False
+        await self.hub.close()
+
+    async def send_update(self, message: str, vad_state: str = "bootstrapping"):
+        await self.send_event(
+            {"type": "status", "message": message, "vad_state": vad_state}
+        )
+
+    async def send_event(self, payload: Dict[str, Any]):
+        self.hub.publish(payload)
+
+    @asynccontextmanager
+    async def single_flight(self, lock: StageLock, description: str):
+        """Holds lock for a stage, first waiting out (and relaying) another instance running it.
+
+        Yields the status callback to use inside the stage, which also feeds the lock's
+        progress file so that other waiters can follow along.
+        """
+        if not lock.try_acquire():
+            logger.info(f"Another bootstrapper holds {lock.path.name}, waiting for it")
+            await self.send_update(f"Waiting for another instance to finish {description}...")
+            last_message = None
+            while not lock.try_acquire():
+                progress = lock.read_progress()
+                if progress and progress.get("message") != last_message:
+                    last_message = progress.get("message")
+                    await self.send_update(last_message)
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+        async def update(message: str):
+            lock.report(message)
+            await self.send_update(message)
+
+        try:
+            yield update
+        finally:
+            lock.release()
+
+    async def run_command(
+        self, cmd, cwd=None, env=None, stage: str = "sync", send_update=None, output: Optional[List[str]] = None
+    ):
+        if env is None:
+            env = os.environ.copy()
+        # Remove VIRTUAL_ENV to ensure the child uv process targets the project environment
+        env.pop("VIRTUAL_ENV", None)
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd, env=env
+        )
+        # The reader only feeds the stream, so a slow client never stalls the pipe
+        stream = StatusStream(stage, send_update or self.send_update, self.send_event)
+        flusher = asyncio.create_task(stream.run())
+        try:
+            if process.stdout:
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+                    line_str = line.decode(errors="replace").strip()
+                    if line_str:
+                        stream.feed(line_str)
+                        if output is not None:
+                            output.append(line_str)
+        finally:
+            stream.close()
+            await flusher
+        return await process.wait()
+
+    async def detect_stage(self) -> Dict[str, str]:
+        await self.send_update("Detecting Hardware...")
+        hw = await self.detector.get_best_mode()
+        await self.send_update(f"Hardware: {hw['desc']}. Target mode: {hw['hw_mode']}")
+        variant, reason = select_model_variant(hw["hw_mode"])
+        await self.send_update(f"Model variant: {variant} ({reason})")
+        if hw["hw_mode"] == "cpu":
+            threads = self.env_manager.thread_settings()
+            topology = threads["topology"]
+            await self.send_update(
+                f"CPU: {topology['physical']} cores, {topology['logical']} threads, "
+                f"{topology['numa_nodes']} NUMA node(s). Inference threads: {threads['intra_op']}"
+            )
+        return hw
+
+    async def model_stage(self, hw: Dict[str, str]):
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        model_dest = self.models_dir / MODEL_DIR_NAME
+        # Another instance may be provisioning the same directory; whatever it finishes is reused
+        lock = StageLock(self.models_dir / f".{MODEL_DIR_NAME}.lock")
+        async with self.single_flight(lock, "downloading the model") as update:
+            await self.env_manager.provision_model(
+                MODEL_REPO,
+                model_dest,
+                model_patterns(hw["hw_mode"]),
+                update,
+                self.model_store,
+                lambda progress: self.send_event({"type": "progress", "stage": "model", **progress}),
+            )
+
+    async def sync_stage(self, hw: Dict[str, str]):
+        lock = StageLock(self.env_manager.babelfish_dir / ".sync.lock")
+        async with self.single_flight(lock, "installing dependencies") as update:
+            await self._sync(hw, update)
+
+    async def _sync(self, hw: Dict[str, str], update):
+        hw_mode = hw["hw_mode"]
+        # Checked under the lock, so a sync another instance just finished is picked up here
+        mismatch = self.env_manager.marker_mismatch(hw_mode)
+        if not mismatch:
+            await update("Environment matches hardware, skipping sync.")
+            return
+
+        previous = self.env_manager.read_marker(hw_mode)
+        packages = self.env_manager.lock_packages()
+        if "packages" in previous and packages:
+            diff = self.env_manager.package_diff(previous["packages"], packages)
+            changes = sum(len(names) for names in diff.values())
+            if mismatch == ["lock_hash"] and changes == 0:
+                # Lockfile rewritten without changing any pin (e.g. metadata only)
+                logger.info("uv.lock changed but pins are identical, keeping environment")
+                self.env_manager.write_marker(hw_mode, hw["extra"])
+                self.env_manager.write_launch_plan(hw_mode)
+                await update("Environment matches hardware, skipping sync.")
+                return
+            for kind, names in diff.items():
+                if names:
+                    logger.info(f"Dependencies {kind}: {', '.join(names)}")
+            await update(
+                f"Updating {changes} dependencies ({len(diff['added'])} added, "
+                f"{len(diff['changed'])} changed, {len(diff['removed'])} removed)..."
+            )
+        logger.info(f"Environment out of date ({', '.join(mismatch)})")
+
+        mirror = self.env_manager.offline_mirror()
+        if mirror.covers(hw_mode, self.env_manager.lock_hash()):
+            logger.info(f"Offline mode: installing from {mirror.root}")
+            await update(f"Offline mode: installing {hw_mode} dependencies from the local {mirror.describe()}...")
+            await self._install_from_mirror(mirror, hw_mode, update)
+        elif OfflineMirror.forced():
+            raise RuntimeError(f"Offline mode: no imported bundle covers {hw_mode}")
+        else:
+            await update(f"Syncing dependencies for {hw_mode}...")
+
+            # Each mode has its own slot, so other modes' venvs stay intact for a later switch back
+            # and a slot's onnxruntime variant never changes: uv sync only applies lock changes
+            ret = await self.run_command(
+                [UV_CMD, "sync", "--extra", hw["extra"]],
+                cwd=babelfish_dir(),
+                env=self.env_manager.uv_env(hw_mode),
+                send_update=update,
+            )
+            if ret != 0:
+                raise RuntimeError(f"uv sync exited with code {ret}")
+        self.env_manager.write_marker(hw_mode, hw["extra"])
+        self.env_manager.write_launch_plan(hw_mode)
+        self.env_manager.remove_legacy_venv()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.env_manager.evict_slots, hw_mode
+        )
+
+    async def _install_from_mirror(self, mirror: OfflineMirror, hw_mode: str, update):
+        """Installs the slot from the mirror's wheel directory: no index, no network."""
+        env = self.env_manager.uv_env(hw_mode)
+        env["UV_OFFLINE"] = "1"
+        python = self.env_manager.venv_python(hw_mode)
+        commands = []
+        if not python.exists():
+            venv_dir = self.env_manager.venv_dir(hw_mode)
+            shutil.rmtree(venv_dir, ignore_errors=True)
+            commands.append([UV_CMD, "venv", "--python", sys.executable, str(venv_dir)])
+        commands.append(
+            [
+                UV_CMD, "pip", "install", "--python", str(python),
+                "--no-index", "--find-links", str(mirror.wheels_dir),
+                "-r", str(mirror.requirements(hw_mode)), str(mirror.project_wheel()),
+            ]
+        )
+        for cmd in commands:
+            ret = await self.run_command(cmd, cwd=babelfish_dir(), env=env, send_update=update)
+            if ret != 0:
+                raise RuntimeError(f"uv {cmd[1]} exited with code {ret}")
+
+    async def prewarm_stage(self, hw: Dict[str, str]):
+        self.launcher.prewarm(hw["hw_mode"])
+
+    async def optimize_stage(self, hw: Dict[str, str]):
+        """Saves the model graphs optimized for the mode's provider, once per ORT build and model."""
+        if not GRAPH_OPTIMIZE:
+            return
+        hw_mode = hw["hw_mode"]
+        cache = GraphCache(self.models_dir / MODEL_DIR_NAME)
+        ort_version = self.env_manager.ort_version(hw_mode)
+        if ort_version is None:
+            logger.info(f"No {ORT_PACKAGES.get(hw_mode)} wheel in the {hw_mode} slot, skipping graph optimization")
+            return
+        target = cache.target(hw_mode, ort_version)
+        if target is None:
+            logger.info("Model files are not verified yet, skipping graph optimization")
+            return
+        if cache.is_built(target):
+            return
+        lock = StageLock(self.models_dir / f".{MODEL_DIR_NAME}.optimize.lock")
+        async with self.single_flight(lock, "optimizing the model") as update:
+            if cache.is_built(target):
+                return
+            try:
+                await self._optimize(cache, hw_mode, ort_version, target, update)
+            except Exception as e:
+                # Not fatal: ORT then optimizes the original graphs at load time, as before
+                logger.warning(f"Graph optimization failed: {e}")
+                await update("Model optimization failed, using the original graphs")
+
+    async def _optimize(self, cache: GraphCache, hw_mode: str, ort_version: str, target: Path, update):
+        provider, level = ORT_OPTIMIZATION[hw_mode]
+        await update(f"Optimizing model graphs for {provider} (one-time)...")
+        loop = asyncio.get_running_loop()
+        staging, job = await loop.run_in_executor(None, cache.prepare, hw_mode, target)
+        output: List[str] = []
+        ret = await self.run_command(
+            [str(self.env_manager.venv_python(hw_mode)), "-c", GRAPH_OPTIMIZE_SCRIPT, json.dumps(job)],
+            cwd=str(staging),
+            env=self.env_manager.get_env_with_dll_injection(hw_mode),
+            stage="optimize",
+            send_update=update,
+            output=output,
+        )
+        if ret != 0:
+            shutil.rmtree(staging, ignore_errors=True)
+            # The last line is the exception (traceback tail or sys.exit message), e.g. a failed import
+            raise RuntimeError(f"optimizer exited with code {ret}: {output[-1] if output else 'no output'}")
+        info = {
+            "ort": ort_version,
+            "variant": select_model_variant(hw_mode)[0],
+            "provider": provider,
+            "level": level,
+            "created": time.time(),
+        }
+        await loop.run_in_executor(None, cache.commit, staging, target, info)
+        logger.info(f"Optimized model graphs saved to {target}")
+
+    async def autotune_stage(self, hw: Dict[str, str]):
+        """Times the encoder at a few CPU thread counts, once per model variant and ORT build."""
+        hw_mode = hw["hw_mode"]
+        if not CPU_AUTOTUNE or hw_mode != "cpu" or self.env_manager.threads_tuned(hw_mode):
+            return
+        model_dir = self.launcher.optimized_model_dir(hw_mode, force_cpu=False)
+        model_dir = model_dir or self.models_dir / MODEL_DIR_NAME
+        encoder = next(
+            (p for p in sorted(model_dir.glob("encoder-model*.onnx"))
+             if p.name in model_patterns(hw_mode)),
+            None,
+        )
+        if encoder is None:
+            return
+        await self.send_update("Tuning CPU inference threads (one-time)...")
+        try:
+            settings = await asyncio.get_running_loop().run_in_executor(
+                None, self.env_manager.autotune_threads, hw_mode, encoder
+            )
+        except Exception as e:
+            # The topology-derived settings stay in place
+            logger.warning(f"CPU thread autotune failed: {e}")
+            await self.send_update("CPU thread tuning failed, keeping the defaults")
+            return
+        await self.send_update(f"Inference threads: {settings['intra_op']} (tuned)")
+
+    async def run_bootstrap(self):
+        # Model download and dependency sync are independent, so they run side by side
+        pipeline = StagePipeline()
+        pipeline.add("detect", self.detect_stage)
+        pipeline.add(
+            "model", lambda: self.model_stage(pipeline.result("detect")), ["detect"]
+        )
+        pipeline.add(
+            "sync", lambda: self.sync_stage(pipeline.result("detect")), ["detect"]
+        )
+        # Starts the page cache readahead as soon as the model is in place, overlapping the sync
+        pipeline.add(
+            "prewarm",
+            lambda: self.prewarm_stage(pipeline.result("detect")),
+            ["model"],
+        )
+        # Needs both the model files and the slot's onnxruntime
+        pipeline.add(
+            "optimize",
+            lambda: self.optimize_stage(pipeline.result("detect")),
+            ["model", "sync"],
+        )
+        # Times the graphs Babelfish will load, without competing with the optimizer for CPU
+        pipeline.add(
+            "autotune",
+            lambda: self.autotune_stage(pipeline.result("detect")),
+            ["optimize"],
+        )
+
+        ok = await pipeline.run()
+        pipeline.log_timings()
+        if not ok:
+            for stage in pipeline.failed():
+                await self.send_update(f"Stage '{stage.name}' failed: {stage.error}")
+            return
+
+        hw = pipeline.result("detect")
+        hw_mode = hw["hw_mode"]
+        if not self.env_manager.launch_plan_file(hw_mode).exists():
+            # Environments synced before launch plans existed
+            self.env_manager.write_launch_plan(hw_mode)
+
+        launch = self.launcher.build_launch(hw)
+        await self.send_event({"type": "timings", **TRACER.summary("bootstrap")})
+
+        await self.send_update("Starting Babelfish...")
+        await asyncio.sleep(0.5)
+        self.completed = True
+        await self.hub.close()
+
+        # Signal completion to the main loop
+        if self.completion_future and not self.completion_future.done():
+            self.completion_future.set_result(launch)
+
+
+async def serve(launcher: Launcher, args: argparse.Namespace) -> Tuple[List[str], Dict[str, str]]:
+    """Runs the bootstrap for the first client to connect and returns the launch command."""
+    server = BootstrapServer(launcher, redetect=args.redetect)
+    # Create a Future to signal completion
+    loop = asyncio.get_running_loop()
+    completion_future = loop.create_future()
+    server.set_completion_future(completion_future)
+
+    async with websockets.serve(server.handle_connection, "127.0.0.1", PORT):
+        logger.info(f"BOOTSTRAP SERVER STARTED port={PORT}")
+        # Wait for the bootstrap to finish and return the launch command
+        launch = await completion_future
+
+    # Server is now closed, port should be free
+    logger.info(f"Bootstrap server stopped. Launching Babelfish on port {PORT}...")
+    return launch
+
+
+def run(launcher: Launcher, args: argparse.Namespace) -> Tuple[List[str], Dict[str, str]]:
+    return asyncio.run(serve(launcher, args))
+
+
+if __name__ == "__main__":
+    # Re-run by bootstrap.py through `uv run`, so the inline dependencies are available
+    process_start = TRACER.origin
+    trace_state = os.environ.pop("VOGON_BOOTSTRAP_TRACE", None)
+    if trace_state:
+        TRACER.resume(trace_state)
+    TRACER.add("import:server", process_start, time.perf_counter())
+    args = parse_args()
+    launcher = Launcher(
+        Path(args.models_dir) if args.models_dir else None, args.supervise, args.standby
+    )
+    prewarmed = os.environ.pop("VOGON_BOOTSTRAP_PREWARMED", None)
+    if prewarmed:
+        launcher.resume_prewarm(prewarmed)
+    try:
+        launcher.exec(run(launcher, args), "bootstrap")
+    except KeyboardInterrupt:
+        pass
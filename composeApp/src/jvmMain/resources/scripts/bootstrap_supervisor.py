@@ -0,0 +1,342 @@
+"""
+Supervisor mode (bootstrap.py --supervise): keeps Babelfish running, restarts it after crashes,
+optionally keeps a warm standby for the other device, and serves health and metrics.
+"""
+
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+from bootstrap_core import (
+    PORT,
+    RELAY_BUFFER_SIZE,
+    STANDBY_PORTS,
+    SUPERVISOR_BACKOFF_INITIAL,
+    SUPERVISOR_BACKOFF_MAX,
+    SUPERVISOR_MAX_QUICK_CRASHES,
+    SUPERVISOR_STABLE_SECONDS,
+    TRACER,
+    logger,
+)
+
+
+class ManagedProcess:
+    """One Babelfish child with its own restart loop (exponential backoff)."""
+
+    def __init__(
+        self,
+        name: str,
+        launch: Tuple[List[str], Dict[str, str]],
+        stop_event: threading.Event,
+        port: int = PORT,
+    ):
+        self.name = name
+        self.args, self.env = launch
+        self.port = port
+        self.stop_event = stop_event
+        self.process: Optional[subprocess.Popen] = None
+        self.state = "starting"
+        self.restarts = 0
+        self.quick_crashes = 0
+        self.last_exit_code: Optional[int] = None
+        self.child_started: Optional[float] = None
+
+    def terminate(self):
+        process = self.process
+        if process and process.poll() is None:
+            process.terminate()
+
+    def run(self) -> int:
+        backoff = SUPERVISOR_BACKOFF_INITIAL
+        while not self.stop_event.is_set():
+            logger.info(
+                f"Launching Babelfish on port {self.port} ({self.name}, supervised, restarts={self.restarts})..."
+            )
+            self.process = subprocess.Popen(self.args, env=self.env)
+            self.child_started = time.time()
+            self.state = "running"
+            code = self.process.wait()
+            uptime = time.time() - self.child_started
+            self.last_exit_code = code
+            self.child_started = None
+
+            if self.stop_event.is_set():
+                break
+            if code == 0:
+                logger.info(f"Babelfish ({self.name}) exited cleanly")
+                self.state = "stopped"
+                return 0
+
+            if uptime >= SUPERVISOR_STABLE_SECONDS:
+                backoff = SUPERVISOR_BACKOFF_INITIAL
+                self.quick_crashes = 0
+            self.quick_crashes += 1
+            if self.quick_crashes > SUPERVISOR_MAX_QUICK_CRASHES:
+                logger.error(
+                    f"Babelfish ({self.name}) crashed {self.quick_crashes} times in a row, giving up (exit code {code})"
+                )
+                self.state = "failed"
+                return code
+
+            self.state = "restarting"
+            logger.warning(
+                f"Babelfish ({self.name}) exited with code {code} after {uptime:.1f}s, restarting in {backoff:.1f}s"
+            )
+            if self.stop_event.wait(backoff):
+                break
+            self.restarts += 1
+            backoff = min(backoff * 2, SUPERVISOR_BACKOFF_MAX)
+
+        self.state = "stopped"
+        return 0
+
+    def health(self) -> Dict[str, Any]:
+        process = self.process
+        return {
+            "state": self.state,
+            "pid": process.pid if process and process.poll() is None else None,
+            "port": self.port,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "uptime_s": round(time.time() - self.child_started, 1) if self.child_started else 0.0,
+        }
+
+
+class PortRelay:
+    """Forwards TCP connections on a port to whichever Babelfish instance is active."""
+
+    def __init__(self, port: int, target_port: Callable[[], int]):
+        self.port = port
+        self.target_port = target_port
+        self.connections: List[Tuple[socket.socket, socket.socket]] = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        server = socket.create_server(("127.0.0.1", self.port))
+        threading.Thread(target=self._accept, args=(server,), daemon=True).start()
+
+    def _accept(self, server: socket.socket):
+        while True:
+            client, _ = server.accept()
+            threading.Thread(target=self._connect, args=(client,), daemon=True).start()
+
+    def _connect(self, client: socket.socket):
+        try:
+            upstream = socket.create_connection(("127.0.0.1", self.target_port()), timeout=5)
+            upstream.settimeout(None)
+        except OSError:
+            # Instance still loading; the client retries like it would against Babelfish itself
+            client.close()
+            return
+        pair = (client, upstream)
+        with self.lock:
+            self.connections.append(pair)
+        threading.Thread(target=self._pump, args=(upstream, client, pair), daemon=True).start()
+        self._pump(client, upstream, pair)
+
+    def _pump(self, source: socket.socket, sink: socket.socket, pair):
+        try:
+            while True:
+                data = source.recv(RELAY_BUFFER_SIZE)
+                if not data:
+                    break
+                sink.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self._close(pair)
+
+    def _close(self, pair):
+        with self.lock:
+            if pair in self.connections:
+                self.connections.remove(pair)
+        for sock in pair:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def drop_all(self):
+        """Disconnects every client so it reconnects to the newly active instance."""
+        with self.lock:
+            pairs = list(self.connections)
+        for pair in pairs:
+            self._close(pair)
+
+
+class Supervisor:
+    """Keeps Babelfish running after launch, optionally with a warm standby for the other device.
+
+    Without a standby, one instance listens on PORT directly. With one, a GPU and a CPU
+    instance listen on internal ports and PORT relays to the active one; switching (via
+    POST /switch?device=cpu|gpu, sent by the app) only moves the relay, so neither model
+    is reloaded. The supervisor exits once the active instance stops or gives up. Health
+    and metrics are served on PORT + 1 (/health as JSON, /metrics as Prometheus text).
+    """
+
+    def __init__(
+        self,
+        launch: Tuple[List[str], Dict[str, str]],
+        trace_path: str,
+        standby: Optional[Dict[str, Tuple[List[str], Dict[str, str]]]] = None,
+        active: str = "gpu",
+    ):
+        self.trace_path = trace_path
+        self.supervisor_started = time.time()
+        self.stop_event = threading.Event()
+        self.instance_exited = threading.Event()
+        if standby:
+            self.instances = {
+                device: ManagedProcess(device, standby[device], self.stop_event, STANDBY_PORTS[device])
+                for device in ("gpu", "cpu")
+            }
+            self.active = active
+            self.relay: Optional[PortRelay] = PortRelay(PORT, lambda: self.instances[self.active].port)
+        else:
+            self.instances = {"main": ManagedProcess("main", launch, self.stop_event)}
+            self.active = "main"
+            self.relay = None
+
+    def stop(self, *_):
+        self.stop_event.set()
+        for instance in self.instances.values():
+            instance.terminate()
+
+    def run(self) -> int:
+        if sys.platform != "win32":
+            import signal
+
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        self.start_health_server()
+
+        if not self.relay:
+            return self.instances["main"].run()
+
+        self.relay.start()
+        logger.info(f"Standby mode: relaying port {PORT} to the {self.active} instance")
+        threads = []
+        for instance in self.instances.values():
+            thread = threading.Thread(target=self._run_instance, args=(instance,), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        # Whichever instance is active now decides the lifetime: a standby that gives up only
+        # shows as failed in /health, while the active one ending stops both
+        while True:
+            self.instance_exited.wait()
+            self.instance_exited.clear()
+            active = self.instances[self.active]
+            if active.state in ("stopped", "failed"):
+                break
+        self.stop()
+        for thread in threads:
+            thread.join(timeout=10)
+        return (active.last_exit_code or 1) if active.state == "failed" else 0
+
+    def _run_instance(self, instance: ManagedProcess):
+        try:
+            instance.run()
+        except Exception as e:
+            logger.error(f"Babelfish ({instance.name}) could not be started: {e}")
+            instance.state = "failed"
+        finally:
+            self.instance_exited.set()
+
+    def switch(self, device: str) -> Tuple[bool, str]:
+        if device not in self.instances or not self.relay:
+            return False, f"no '{device}' instance (standby mode off or unknown device)"
+        if device == self.active:
+            return True, f"{device} already active"
+        if self.instances[device].state != "running":
+            return False, f"{device} instance is {self.instances[device].state}"
+        previous, self.active = self.active, device
+        self.relay.drop_all()
+        logger.info(f"Switched active Babelfish from {previous} to {device}")
+        return True, f"switched to {device}"
+
+    def health(self) -> Dict[str, Any]:
+        active = self.instances[self.active].health()
+        return {
+            **active,
+            "port": PORT,
+            "active": self.active,
+            "instances": {name: i.health() for name, i in self.instances.items()},
+            "supervisor_uptime_s": round(time.time() - self.supervisor_started, 1),
+            "bootstrap_path": self.trace_path,
+        }
+
+    def metrics(self) -> str:
+        lines = [
+            "# TYPE vogon_babelfish_up gauge",
+            "# TYPE vogon_babelfish_restarts_total counter",
+            "# TYPE vogon_babelfish_uptime_seconds gauge",
+            "# TYPE vogon_babelfish_active gauge",
+        ]
+        for name, instance in self.instances.items():
+            health = instance.health()
+            label = f'{{instance="{name}"}}'
+            lines += [
+                f"vogon_babelfish_up{label} {1 if health['state'] == 'running' else 0}",
+                f"vogon_babelfish_restarts_total{label} {health['restarts']}",
+                f"vogon_babelfish_uptime_seconds{label} {health['uptime_s']}",
+                f"vogon_babelfish_active{label} {1 if name == self.active else 0}",
+            ]
+        lines.append("# TYPE vogon_bootstrap_span_milliseconds gauge")
+        for span in TRACER.spans:
+            lines.append(
+                f'vogon_bootstrap_span_milliseconds{{name="{span["name"]}"}} {span["duration_ms"]}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def start_health_server(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+
+        supervisor = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def reply(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    health = supervisor.health()
+                    self.reply(200 if health["state"] == "running" else 503, json.dumps(health).encode())
+                elif self.path == "/metrics":
+                    self.reply(200, supervisor.metrics().encode(), "text/plain; version=0.0.4")
+                else:
+                    self.reply(404, b"{}")
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != "/switch":
+                    self.reply(404, b"{}")
+                    return
+                device = parse_qs(url.query).get("device", [""])[0]
+                ok, message = supervisor.switch(device)
+                self.reply(
+                    200 if ok else 409,
+                    json.dumps({"ok": ok, "message": message, "active": supervisor.active}).encode(),
+                )
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", PORT + 1), HealthHandler)
+        except OSError as e:
+            logger.warning(f"Health endpoint unavailable on port {PORT + 1}: {e}")
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Supervisor health endpoint on http://127.0.0.1:{PORT + 1}/health")
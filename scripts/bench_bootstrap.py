@@ -0,0 +1,523 @@
+# /// script
+# dependencies = [
+#   "websockets",
+#   "huggingface-hub",
+# ]
+# ///
+"""
+Startup benchmark for composeApp/src/jvmMain/resources/scripts/bootstrap.py.
+
+Runs the bootstrap script as a real subprocess inside a throwaway sandbox, against a
+local stand-in for the Hugging Face endpoint and a fake `uv` shim, and times it from
+process start until the launched (fake) Babelfish reports in. Per-phase numbers come
+from the trace bootstrap.py exports (bootstrap_trace.jsonl).
+
+Scenarios:
+  cold         empty cache, models, venv and model store
+  warm         everything current, no websocket server
+  mode_switch  alternates the cached detection between CPU and GPU
+  corrupt      a model file is damaged in place before each run
+
+Usage (from the repository root):
+  uv run scripts/bench_bootstrap.py --runs 5 --output bench.json
+  uv run scripts/bench_bootstrap.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = REPO_ROOT / "composeApp/src/jvmMain/resources/scripts"
+BOOTSTRAP_FILES = [
+    "bootstrap.py",
+    "bootstrap_core.py",
+    "bootstrap_provision.py",
+    "bootstrap_supervisor.py",
+    "bootstrap_server.py",
+]
+MODEL_REPO = "istupakov/parakeet-tdt-0.6b-v3-onnx"
+MODEL_DIR_NAME = "nemo-parakeet-tdt-0.6b-v3"
+READY_LINE = "BENCH BABELFISH READY"
+SCENARIOS = ["cold", "warm", "mode_switch", "corrupt"]
+
+# Relative sizes of the real repository files, scaled by --model-mb
+MODEL_FILES = {
+    "encoder-model.onnx": 0.01,
+    "encoder-model.onnx.data": 0.70,
+    "encoder-model.int8.onnx": 0.18,
+    "decoder_joint-model.onnx": 0.05,
+    "decoder_joint-model.int8.onnx": 0.02,
+    "nemo128.onnx": 0.002,
+    "config.json": 0.0001,
+    "vocab.txt": 0.0005,
+}
+
+GPU_MODE = {
+    "win32": {"hw_mode": "nvidia_win", "extra": "nvidia-win", "desc": "NVIDIA GPU (bench)"},
+}.get(sys.platform, {"hw_mode": "nvidia_linux", "extra": "nvidia-linux", "desc": "NVIDIA GPU (bench)"})
+CPU_MODE = {"hw_mode": "cpu", "extra": "cpu", "desc": "CPU (bench)"}
+
+FAKE_LOCK = """version = 1
+requires-python = ">=3.12"
+
+[[package]]
+name = "babelfish-bench"
+version = "0.0.0"
+source = { editable = "." }
+
+[[package]]
+name = "numpy"
+version = "2.2.1"
+source = { registry = "https://pypi.org/simple" }
+
+[[package]]
+name = "onnxruntime"
+version = "1.20.1"
+source = { registry = "https://pypi.org/simple" }
+"""
+
+FAKE_UV = r'''
+import os, sys, time, venv
+from pathlib import Path
+
+args = sys.argv[1:]
+project = Path.cwd()
+venv_dir = Path(os.environ.get("UV_PROJECT_ENVIRONMENT") or project / ".venv")
+bin_dir = venv_dir / ("Scripts" if sys.platform == "win32" else "bin")
+python = bin_dir / ("python.exe" if sys.platform == "win32" else "python")
+
+if args[:1] == ["sync"]:
+    extra = args[args.index("--extra") + 1] if "--extra" in args else "cpu"
+    print("Resolved 64 packages in 12ms", flush=True)
+    for i in range(int(os.environ.get("BENCH_SYNC_PACKAGES", "20"))):
+        print(f"Downloading pkg{i} (1.0MiB)", flush=True)
+        print(f" Downloaded pkg{i}", flush=True)
+    time.sleep(float(os.environ.get("BENCH_SYNC_DELAY", "0.5")))
+    if not python.exists():
+        venv.EnvBuilder(symlinks=sys.platform != "win32", with_pip=False).create(venv_dir)
+    if sys.platform == "win32":
+        site = venv_dir / "Lib" / "site-packages"
+    else:
+        site = next((venv_dir / "lib").glob("python*")) / "site-packages"
+    dist = site / "babelfish_bench-0.0.0.dist-info"
+    dist.mkdir(parents=True, exist_ok=True)
+    (dist / "METADATA").write_text("Metadata-Version: 2.1\nName: babelfish-bench\nVersion: 0.0.0\n")
+    (dist / "entry_points.txt").write_text("[console_scripts]\nbabelfish = babelfish_bench:run\n")
+    (site / "babelfish_bench.py").write_text(
+        "import sys\ndef run():\n    print(%r, ' '.join(sys.argv[1:]), flush=True)\n    return 0\n"
+        % os.environ.get("BENCH_READY_LINE", "READY")
+    )
+    print(f" + babelfish-bench==0.0.0 ({extra})", flush=True)
+elif args[:1] == ["run"] and any(a.endswith(".py") for a in args):
+    # Script re-run by the launcher: the benchmark interpreter already has its deps
+    script = next(i for i, a in enumerate(args) if a.endswith(".py"))
+    os.execv(sys.executable, [sys.executable, *args[script:]])
+elif args[:1] == ["run"]:
+    rest = [a for a in args[1:] if a != "--no-sync"]
+    os.execv(str(python), [str(python), "-c", "import sys, babelfish_bench; sys.argv[0] = 'babelfish'; sys.exit(babelfish_bench.run())", *rest[1:]])
+else:
+    print(f"fake uv: unsupported command {args}", file=sys.stderr)
+    sys.exit(2)
+'''
+
+
+# --- Stand-in Hugging Face endpoint ---
+
+
+class ModelHost:
+    """Serves synthetic model files with the HF metadata and resolve (Range) endpoints."""
+
+    def __init__(self, root: Path, total_mb: float, connection_mbps: float = 0.0):
+        self.root = root
+        # Per-connection bandwidth cap (0 = unlimited), like a CDN or a poor link would impose
+        self.connection_mbps = connection_mbps
+        self.root.mkdir(parents=True, exist_ok=True)
+        rng = random.Random(0)
+        for name, fraction in MODEL_FILES.items():
+            size = max(64, int(total_mb * fraction * 1024 * 1024))
+            (root / name).write_bytes(rng.randbytes(size))
+        self.siblings = []
+        for name in sorted(MODEL_FILES):
+            data = (root / name).read_bytes()
+            entry = {
+                "rfilename": name,
+                "size": len(data),
+                "blobId": hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest(),
+            }
+            if name.endswith((".onnx", ".data")):
+                entry["lfs"] = {
+                    "size": len(data),
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                    "pointerSize": 134,
+                }
+            self.siblings.append(entry)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _handler(self):
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/api/models/"):
+                    body = json.dumps(
+                        {"id": MODEL_REPO, "sha": "0" * 40, "siblings": host.siblings}
+                    ).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                match = re.match(r"/.+?/.+?/resolve/[^/]+/([^?]+)", self.path)
+                if not match or not (host.root / match.group(1)).is_file():
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = (host.root / match.group(1)).read_bytes()
+                range_header = self.headers.get("Range")
+                if range_header:
+                    start, _, end = range_header.split("=", 1)[1].partition("-")
+                    start, end = int(start), int(end) if end else len(data) - 1
+                    chunk = data[start : end + 1]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                else:
+                    chunk = data
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(chunk)))
+                self.end_headers()
+                if not host.connection_mbps:
+                    self.wfile.write(chunk)
+                    return
+                step = 256 * 1024
+                for offset in range(0, len(chunk), step):
+                    self.wfile.write(chunk[offset : offset + step])
+                    time.sleep(step / (host.connection_mbps * 1024 * 1024))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+
+
+# --- Sandbox ---
+
+
+class Sandbox:
+    """A copy of the bundled layout (scripts/ next to babelfish/) plus app data dirs."""
+
+    def __init__(self, root: Path, host: ModelHost, args: argparse.Namespace):
+        self.root = root
+        self.host = host
+        self.args = args
+        self.scripts_dir = root / "scripts"
+        self.babelfish_dir = root / "babelfish"
+        self.cache_dir = root / "cache"
+        self.data_dir = root / "data"
+        self.models_dir = self.cache_dir / "models"
+        self.store_dir = root / "store"
+        self.bin_dir = root / "bin"
+
+    def reset(self):
+        if self.root.exists():
+            shutil.rmtree(self.root)
+        for path in (self.scripts_dir, self.babelfish_dir, self.cache_dir, self.data_dir, self.bin_dir):
+            path.mkdir(parents=True)
+        for name in BOOTSTRAP_FILES:
+            shutil.copy2(SCRIPTS_DIR / name, self.scripts_dir / name)
+        (self.babelfish_dir / "pyproject.toml").write_text(
+            '[project]\nname = "babelfish-bench"\nversion = "0.0.0"\n'
+        )
+        (self.babelfish_dir / "uv.lock").write_text(FAKE_LOCK)
+        shim = self.bin_dir / "fake_uv.py"
+        shim.write_text(FAKE_UV)
+        if sys.platform == "win32":
+            self.uv_cmd = self.bin_dir / "uv.cmd"
+            self.uv_cmd.write_text(f'@"{sys.executable}" "{shim}" %*\n')
+        else:
+            self.uv_cmd = self.bin_dir / "uv"
+            self.uv_cmd.write_text(f"#!{sys.executable}\n" + FAKE_UV)
+            self.uv_cmd.chmod(0o755)
+
+    def env(self, port: int) -> Dict[str, str]:
+        env = dict(os.environ)
+        for key in ("VIRTUAL_ENV", "VOGON_FORCE_CPU", "HF_HUB_OFFLINE"):
+            env.pop(key, None)
+        env.update(
+            {
+                "UV_CMD": str(self.uv_cmd),
+                "VOGON_APP_CACHE_DIR": str(self.cache_dir),
+                "VOGON_APP_DATA_DIR": str(self.data_dir),
+                "VOGON_MODEL_STORE_DIR": str(self.store_dir),
+                "VOGON_BOOTSTRAP_PORT": str(port),
+                "HF_ENDPOINT": self.host.url,
+                "HF_HUB_DISABLE_TELEMETRY": "1",
+                "BENCH_READY_LINE": READY_LINE,
+                "BENCH_SYNC_DELAY": str(self.args.sync_delay),
+                "VOGON_DOWNLOAD_CONNECTIONS": str(self.args.connections),
+                "PYTHONUNBUFFERED": "1",
+            }
+        )
+        return env
+
+    def force_mode(self, mode: Dict[str, str]):
+        """Rewrites the cached detection result, keeping its fingerprint valid."""
+        cache_file = self.cache_dir / "hw_detection.json"
+        data = json.loads(cache_file.read_text())
+        data["result"] = dict(mode)
+        cache_file.write_text(json.dumps(data))
+
+    def corrupt_model(self):
+        """Damages the largest model file in place, as a bad disk or partial write would."""
+        model_dir = self.models_dir / MODEL_DIR_NAME
+        target = max(model_dir.glob("*.onnx*"), key=lambda p: p.stat().st_size)
+        with open(target, "r+b") as f:
+            f.seek(target.stat().st_size // 2)
+            f.write(os.urandom(4096))
+        return target.name
+
+
+# --- Runner ---
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def watch_server(port: int, deadline: float, result: Dict[str, Any], start: float):
+    """Plays the VogonPoet client: connects once the bootstrap server is up, reads until close."""
+    while time.perf_counter() < deadline:
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as ws:
+                result["connected_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if "first_message_ms" not in result:
+                        result["first_message_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    result["messages"] = result.get("messages", 0) + 1
+                    if message.get("type") == "timings":
+                        # The summary fields sit next to "type" (see BootstrapServer.run_bootstrap)
+                        result["reported_timings"] = {k: v for k, v in message.items() if k != "type"}
+            return
+        except (OSError, websockets.exceptions.WebSocketException):
+            await asyncio.sleep(0.02)
+
+
+async def run_once(sandbox: Sandbox, timeout: float) -> Dict[str, Any]:
+    port = free_port()
+    cmd = [sys.executable, str(sandbox.scripts_dir / "bootstrap.py"), "--models-dir", str(sandbox.models_dir)]
+    log_file = sandbox.root / "bootstrap.log"
+    result: Dict[str, Any] = {}
+
+    start = time.perf_counter()
+    with open(log_file, "ab") as log:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=log, env=sandbox.env(port), cwd=sandbox.root
+        )
+        deadline = start + timeout
+        client = asyncio.create_task(watch_server(port, deadline, result, start))
+        try:
+            while True:
+                line = await asyncio.wait_for(proc.stdout.readline(), max(0.1, deadline - time.perf_counter()))
+                if not line:
+                    raise RuntimeError(f"bootstrap exited before Babelfish started (see {log_file})")
+                if line.decode(errors="replace").startswith(READY_LINE):
+                    result["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    break
+        finally:
+            client.cancel()
+            if proc.returncode is None:
+                try:
+                    await asyncio.wait_for(proc.wait(), 5)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+
+    trace_file = sandbox.cache_dir / "bootstrap_trace.jsonl"
+    trace = json.loads(trace_file.read_text().splitlines()[-1])
+    result["path"] = trace["path"]
+    result["total_ms"] = trace["total_ms"]
+    result["phases"] = phase_durations(trace["spans"])
+    return result
+
+
+def phase_durations(spans: List[Dict[str, Any]]) -> Dict[str, float]:
+    """One number per phase: the total duration of the spans with that name."""
+    phases: Dict[str, float] = {}
+    for span in spans:
+        name = span["name"]
+        phases[name] = round(phases.get(name, 0.0) + span["duration_ms"], 1)
+    return phases
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        # Nearest-rank percentile, stable for the small sample counts used here
+        return ordered[max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "n": len(ordered),
+        "min": ordered[0],
+        "p50": rank(50),
+        "p90": rank(90),
+        "p99": rank(99),
+        "max": ordered[-1],
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"paths": sorted({run["path"] for run in runs})}
+    for key in ("wall_ms", "total_ms", "connected_ms", "first_message_ms"):
+        values = [run[key] for run in runs if key in run]
+        if values:
+            summary[key] = percentiles(values)
+    phase_names = sorted({name for run in runs for name in run["phases"]})
+    summary["phases"] = {
+        name: percentiles([run["phases"][name] for run in runs if name in run["phases"]])
+        for name in phase_names
+    }
+    return summary
+
+
+async def run_scenario(name: str, sandbox: Sandbox, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    runs = []
+    if name != "cold":
+        # Every other scenario starts from a fully provisioned CPU install
+        sandbox.reset()
+        await run_once(sandbox, args.timeout)
+
+    mode = CPU_MODE
+    for index in range(args.runs):
+        if name == "cold":
+            sandbox.reset()
+        elif name == "mode_switch":
+            mode = GPU_MODE if mode is CPU_MODE else CPU_MODE
+            sandbox.force_mode(mode)
+        elif name == "corrupt":
+            sandbox.corrupt_model()
+        run = await run_once(sandbox, args.timeout)
+        if name == "mode_switch":
+            run["hw_mode"] = mode["hw_mode"]
+        runs.append(run)
+        print(f"  {name} #{index + 1}: {run['wall_ms']:.0f} ms ({run['path']})", flush=True)
+    return runs
+
+
+def script_digest() -> str:
+    digest = hashlib.sha256()
+    for name in BOOTSTRAP_FILES:
+        digest.update((SCRIPTS_DIR / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        import subprocess
+
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nComparison against {baseline.get('revision') or baseline.get('bootstrap_sha256')}:")
+    for scenario, summary in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        print(f"  {scenario}")
+        rows = [("wall", summary["wall_ms"], base.get("wall_ms"))]
+        rows += [(name, stats, base.get("phases", {}).get(name)) for name, stats in summary["phases"].items()]
+        for label, stats, base_stats in rows:
+            if not base_stats:
+                continue
+            delta = stats["p50"] - base_stats["p50"]
+            pct = (delta / base_stats["p50"] * 100) if base_stats["p50"] else 0.0
+            print(f"    {label:<24} p50 {base_stats['p50']:>9.1f} -> {stats['p50']:>9.1f} ms ({pct:+.1f}%)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark bootstrap.py startup paths")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per scenario")
+    parser.add_argument("--model-mb", type=float, default=32.0, help="Total size of the synthetic model")
+    parser.add_argument("--sync-delay", type=float, default=0.5, help="Seconds the fake `uv sync` takes")
+    parser.add_argument("--connections", type=int, default=4, help="Parallel model download connections")
+    parser.add_argument(
+        "--connection-mbps", type=float, default=0.0, help="Per-connection MiB/s cap of the model host (0 = none)"
+    )
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-run timeout in seconds")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Print p50 deltas against an earlier result file")
+    parser.add_argument("--keep", action="store_true", help="Keep the sandbox for inspection")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="vogon-bench-"))
+    host = ModelHost(work_dir / "hf", args.model_mb, args.connection_mbps)
+    sandbox = Sandbox(work_dir / "sandbox", host, args)
+    results: Dict[str, Any] = {
+        "bootstrap_sha256": script_digest(),
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "platform": {"system": sys.platform, "machine": platform.machine(), "python": platform.python_version()},
+        "config": {"runs": args.runs, "model_mb": args.model_mb, "sync_delay": args.sync_delay},
+        "scenarios": {},
+        "runs": {},
+    }
+    try:
+        for name in args.scenarios:
+            print(f"Scenario {name}", flush=True)
+            runs = await run_scenario(name, sandbox, args)
+            results["runs"][name] = runs
+            results["scenarios"][name] = summarize(runs)
+    finally:
+        host.close()
+        if args.keep:
+            print(f"Sandbox kept at {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print()
+    for name, summary in results["scenarios"].items():
+        wall = summary["wall_ms"]
+        print(f"{name:<12} wall p50 {wall['p50']:>8.1f} ms  p90 {wall['p90']:>8.1f} ms  path {','.join(summary['paths'])}")
+        for phase, stats in summary["phases"].items():
+            print(f"    {phase:<24} p50 {stats['p50']:>8.1f} ms  p90 {stats['p90']:>8.1f} ms")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())